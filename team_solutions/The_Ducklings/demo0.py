@@ -59,7 +59,7 @@ if __name__ == "__main__":
 
     # Or use |+> state or random state:
     # theta, phi = plusState()  # |+> state
-    # theta, phi = random() * 3.1415926535, random() * 2 * 3.1415926535  # Random state
+    # theta, phi = random() * math.pi, random() * 2 * math.pi  # Random state (needs import math)
     
     # Qubit index where we'll inject an error (0-6 for the 7-qubit code)
     # The QEC circuit will detect and correct this error
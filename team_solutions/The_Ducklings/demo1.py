@@ -11,67 +11,78 @@ Upgrades:
 
 States tested:
     |0>, |1>, |+>, |->
+
+Pass --classical to replace the squin simulation with the
+Pauli-frame model (Z-basis inputs only).
 """
 
 import matplotlib
 matplotlib.use("Agg")
 
-from random import randint, random, choice
-from collections import Counter
+import sys
+
+import numpy as np
 
 from bloqade import squin
-from bloqade.pyqrack import StackMemorySimulator
 
 from qec.encoding import prepareLogicalQubit, decode_713_block
 from qec.errors import inject_pauli
-from qec.syndrome import measure_clean_syndromes
-from qec.error_mapping import color_parities, locate_flipped_qubit
-
-emu = StackMemorySimulator()
-
+from qec.syndrome import extract_syndromes, reference_syndromes
+from qec.error_mapping import (CORRECTION_BASIS, CORRECTION_INDEX, QUBIT_SYNDROME, READOUT_FLIP,
+                               pack_bits, syndrome_codes, to_bits)
+from qec.sampling import map_tasks, run_grouped, warm_tasks
+from qec.states import zeroState
 
 # ============================================================
 # Logical input states (Clifford only)
 # ============================================================
 
 CLIFFORD_STATES = {
-    "|0>": (0.0, 0.0),
-    # "|1>": (0.0, 3.1415926535),
-    # "|+>": (0.0, 3.1415926535 / 2),
-    # "|->": (3.1415926535, 3.1415926535 / 2),
+    "|0>": zeroState(),
+    # "|1>": (0.0, np.pi),
+    # "|+>": (0.0, np.pi / 2),
+    # "|->": (np.pi, np.pi / 2),
 }
 
+# The same table as parallel arrays, indexed by a per-shot state index:
+# (n_states, 2) angles and the expected readout (|0>,|+> → 0; |1>,|-> → 1)
+STATE_ANGLES = np.array(list(CLIFFORD_STATES.values()), dtype=float)
+STATE_EXPECTED = np.array([0 if label in ("|0>", "|+>") else 1 for label in CLIFFORD_STATES],
+                          dtype=np.uint8)
+
 
 # ============================================================
 # Multi-error sampler
 # ============================================================
 
-def sample_error_events(p1: float, r: float = 0.25, max_errors: int = 5):
+def sample_error_events(p1: float, shots: int, rng: np.random.Generator,
+                        r: float = 0.25, max_errors: int = 5):
     """
-    Sample k errors with exponentially decreasing probability.
+    Sample k errors per shot with exponentially decreasing probability.
 
     P(1)=p1
     P(2)=p1*r
     P(3)=p1*r^2
     ...
 
-    Returns list of (index, basis).
+    All shots are drawn at once. Returns (k, idx, basis) where k has shape
+    (shots,) and idx/basis have shape (shots, max_errors), with unused
+    slots padded as (-1, 0).
     """
 
-    errors = []
-    prob = p1
-    k = 0
+    # The j-th error fires only if every earlier one did: P = p1 * r^j
+    thresholds = p1 * r ** np.arange(max_errors)
+    fired = rng.random((shots, max_errors)) < thresholds
+    k = np.cumprod(fired, axis=1).sum(axis=1)
 
-    while k < max_errors and random() < prob:
-        k += 1
-        prob *= r
+    idx = rng.integers(0, 7, size=(shots, max_errors))
+    basis = rng.integers(0, 3, size=(shots, max_errors))
 
-    for _ in range(k):
-        idx = randint(0, 6)
-        basis = randint(0, 2)
-        errors.append((idx, basis))
+    unused = np.arange(max_errors) >= k[:, None]
+    idx[unused] = -1
+    basis[unused] = 0
 
-    return errors
+    return k, idx, basis
 
 
 # ============================================================
@@ -94,34 +105,24 @@ def inject_multiple(block,
 
 
 # ============================================================
-# Kernel: Baseline trial
+# Kernel: Syndrome extraction + baseline readout
 # ============================================================
 
-@squin.kernel
-def baseline_trial(theta: float, phi: float,
-                   e1_i, e1_b,
-                   e2_i, e2_b,
-                   e3_i, e3_b,
-                   e4_i, e4_b,
-                   e5_i, e5_b):
-
-    block = prepareLogicalQubit(theta, phi)
+# The probes only read stabilizers, so the data block still holds the
+# (errored) logical state afterwards: decode it in the same shot instead
+# of preparing a separate baseline block.
 
-    inject_multiple(block,
-                    e1_i, e1_b,
-                    e2_i, e2_b,
-                    e3_i, e3_b,
-                    e4_i, e4_b,
-                    e5_i, e5_b)
+@squin.kernel
+def extract_and_readout(data):
 
-    decode_713_block(block)
+    # ---- X and Z probes ----
+    syndromes = extract_syndromes(data)
 
-    return squin.measure(block[6])
+    # ---- Baseline readout ----
+    decode_713_block(data)
 
+    return syndromes[0], syndromes[1], squin.measure(data[6])
 
-# ============================================================
-# Kernel: Syndrome extraction
-# ============================================================
 
 @squin.kernel
 def syndrome_trial(theta: float, phi: float,
@@ -140,168 +141,211 @@ def syndrome_trial(theta: float, phi: float,
                     e4_i, e4_b,
                     e5_i, e5_b)
 
-    # ---- X probe ----
-    probeX = prepareLogicalQubit(0.0, 3.1415926535 / 2)
-    for j in range(7):
-        squin.cx(data[j], probeX[j])
-    measX = squin.broadcast.measure(probeX)
+    return extract_and_readout(data)
 
-    # ---- Z probe ----
-    probeZ = prepareLogicalQubit(0.0, 0.0)
-    for j in range(7):
-        squin.cx(probeZ[j], data[j])
-    for j in range(7):
-        squin.h(probeZ[j])
-    measZ = squin.broadcast.measure(probeZ)
 
-    return measX, measZ
+@squin.kernel
+def syndrome_trial_single(theta: float, phi: float, e1_i, e1_b):
+
+    # Single-error specialization: no sentinel checks on unused slots
+    data = prepareLogicalQubit(theta, phi)
+    inject_pauli(data, e1_i, e1_b)
+    return extract_and_readout(data)
+
+
+@squin.kernel
+def syndrome_trial_double(theta: float, phi: float, e1_i, e1_b, e2_i, e2_b):
+
+    # Two-error specialization: no sentinel checks on unused slots
+    data = prepareLogicalQubit(theta, phi)
+    inject_pauli(data, e1_i, e1_b)
+    inject_pauli(data, e2_i, e2_b)
+    return extract_and_readout(data)
+
+
+# Branch-free kernels by number of injected errors; a kernel for k errors
+# takes (theta, phi, e1_i, e1_b, ..., ek_i, ek_b)
+SPECIALIZED_TRIALS = {1: syndrome_trial_single, 2: syndrome_trial_double}
+
+
+def dispatch_trials(kernel, specialized, shot_args, n_errors):
+    """
+    Run one trial per entry of `shot_args`, in order.
+
+    Shots whose error count k is a key of `specialized` go to that
+    branch-free kernel with the first 2 + 2k arguments; all other shots use
+    the generic sentinel-branching `kernel`.
+    """
+    groups = {}
+    for i, k in enumerate(n_errors):
+        groups.setdefault(k if k in specialized else None, []).append(i)
+
+    results = [None] * len(shot_args)
+    for k, idxs in groups.items():
+        if k is None:
+            group_kernel, width = kernel, len(shot_args[idxs[0]])
+        else:
+            group_kernel, width = specialized[k], 2 + 2 * k
+        args = [shot_args[i][:width] for i in idxs]
+        for i, res in zip(idxs, run_grouped(group_kernel, args)):
+            results[i] = res
+    return results
+
+
+def warm_trial_tasks():
+    """process_pool warm-up: build the trial kernels' tasks once per worker."""
+    warm_tasks(syndrome_trial, *SPECIALIZED_TRIALS.values())
+
+
+def simulate_trials(shot_args, n_errors):
+    """
+    Process-pool entry point: dispatch_trials over one chunk of shots.
+
+    Returns (readout, probe_bits) as uint8 arrays of shape (n,) and
+    (n, 2, 7), so only plain arrays travel back to the parent.
+    """
+    results = dispatch_trials(syndrome_trial, SPECIALIZED_TRIALS, shot_args, n_errors)
+    readout = to_bits([meas for _, _, meas in results])
+    probe_bits = to_bits([(measX, measZ) for measX, measZ, _ in results])
+    return readout, probe_bits
 
 
 # ============================================================
-# Kernel: Correction trial
+# Classical Pauli-frame model
 # ============================================================
 
-@squin.kernel
-def corrected_trial(theta: float, phi: float,
-                    e1_i, e1_b,
-                    e2_i, e2_b,
-                    e3_i, e3_b,
-                    e4_i, e4_b,
-                    e5_i, e5_b,
-                    corr_index: int,
-                    corr_basis: int):
+def pauli_frame_trial(expected, err_idx, err_basis):
+    """
+    Classical counterpart of syndrome_trial for Z-basis inputs (|0>, |1>).
 
-    block = prepareLogicalQubit(theta, phi)
+    Every injected error is a Pauli, so its effect on each syndrome and on
+    the decoded readout is a fixed XOR pattern. Fold those patterns over
+    the (shots, max_errors) error arrays instead of simulating the circuit.
 
-    inject_multiple(block,
-                    e1_i, e1_b,
-                    e2_i, e2_b,
-                    e3_i, e3_b,
-                    e4_i, e4_b,
-                    e5_i, e5_b)
+    Returns (readout, flipX, flipZ); the flips are syndrome codes relative
+    to the error-free reference.
+    """
+
+    active = err_idx >= 0
+    q = np.where(active, err_idx, 0)
 
-    if corr_index >= 0:
-        inject_pauli(block, corr_index, corr_basis)
+    syn = QUBIT_SYNDROME[q]
+    flipX = np.bitwise_xor.reduce(np.where(active & (err_basis != 2), syn, 0), axis=1)
+    flipZ = np.bitwise_xor.reduce(np.where(active & (err_basis != 0), syn, 0), axis=1)
 
-    decode_713_block(block)
-    return squin.measure(block[6])
+    flips = np.where(active, READOUT_FLIP[q, err_basis], 0)
+    readout = expected ^ np.bitwise_xor.reduce(flips, axis=1)
+
+    return readout, flipX, flipZ
 
 
 # ============================================================
 # Benchmark runner
 # ============================================================
 
-def run_modes(p1: float, shots: int = 500):
-
-    # Baseline syndromes
-    baseX, baseZ = list(
-        emu.task(measure_clean_syndromes,
-                 args=(0.0, 0.0)).batch_run(shots=1)
-    )[0]
-
-    synX0 = color_parities([int(b) for b in baseX])
-    synZ0 = color_parities([int(b) for b in baseZ])
-
-    baseline_fail = 0
-    corr_fail = 0
-    post_fail = 0
-
-    post_accept = 0
-    post_total = 0
-
-    flip_hist = Counter()
-
-    for _ in range(shots):
-
-        # Random Clifford input
-        label = choice(list(CLIFFORD_STATES.keys()))
-        theta, phi = CLIFFORD_STATES[label]
-
-        # Sample errors
-        errors = sample_error_events(p1)
-        flip_hist[len(errors)] += 1
-
-        while len(errors) < 5:
-            errors.append((-1, 0))
-
-        (e1_i, e1_b), (e2_i, e2_b), (e3_i, e3_b), (e4_i, e4_b), (e5_i, e5_b) = errors
-
-        # Expected measurement:
-        # |0>,|+> → 0
-        # |1>,|-> → 1
-        expected = 0 if label in ["|0>", "|+>"] else 1
-
-        # ---------------- Baseline ----------------
-        meas = list(
-            emu.task(baseline_trial,
-                     args=(theta, phi,
-                           e1_i, e1_b,
-                           e2_i, e2_b,
-                           e3_i, e3_b,
-                           e4_i, e4_b,
-                           e5_i, e5_b)).batch_run(shots=1)
-        )[0]
-
-        if int(meas) != expected:
-            baseline_fail += 1
-
-        # ---------------- Syndrome ----------------
-        measX, measZ = list(
-            emu.task(syndrome_trial,
-                     args=(theta, phi,
-                           e1_i, e1_b,
-                           e2_i, e2_b,
-                           e3_i, e3_b,
-                           e4_i, e4_b,
-                           e5_i, e5_b)).batch_run(shots=1)
-        )[0]
-
-        synX1 = color_parities([int(b) for b in measX])
-        synZ1 = color_parities([int(b) for b in measZ])
-
-        # ---------------- Postselection ----------------
-        post_total += 1
-
-        if synX1 == synX0 and synZ1 == synZ0:
-            post_accept += 1
-
-            meas_post = int(meas)
-            if meas_post != expected:
-                post_fail += 1
-
-        # ---------------- Correction ----------------
-        x_loc = locate_flipped_qubit(synX0, synX1)
-        z_loc = locate_flipped_qubit(synZ0, synZ1)
-
-        if x_loc != -1 and z_loc != -1:
-            corr_basis, corr_index = 1, x_loc
-        elif x_loc != -1:
-            corr_basis, corr_index = 0, x_loc
-        elif z_loc != -1:
-            corr_basis, corr_index = 2, z_loc
-        else:
-            corr_basis, corr_index = 0, -1
-
-        meas_corr = list(
-            emu.task(corrected_trial,
-                     args=(theta, phi,
-                           e1_i, e1_b,
-                           e2_i, e2_b,
-                           e3_i, e3_b,
-                           e4_i, e4_b,
-                           e5_i, e5_b,
-                           corr_index, corr_basis)).batch_run(shots=1)
-        )[0]
-
-        if int(meas_corr) != expected:
-            corr_fail += 1
+def run_modes(p1: float, shots: int = 500, classical: bool = False, seed=None, max_workers=None):
+    """
+    Compare baseline, postselection and correction over `shots` trials.
+
+    classical=True replaces the squin simulation with pauli_frame_trial;
+    use the default squin path to validate it on a small number of shots.
+    All error events come from one np.random.Generator seeded with `seed`.
+    The simulated shots run in this process unless max_workers is given, in
+    which case they are split over qec.sampling.map_tasks, each worker
+    building the squin tasks once (warm_trial_tasks).
+    """
+
+    # ---------------- Sample all trials ----------------
+    # Every kernel below only depends on (state, errors), so draw the whole
+    # batch up front and let run_grouped submit one task per unique tuple.
+    rng = np.random.default_rng(seed)
+    n_errors, err_idx, err_basis = sample_error_events(p1, shots, rng)
+
+    # Random Clifford input per shot, as an index into the state arrays
+    state_idx = rng.integers(0, len(STATE_ANGLES), size=shots)
+    expected = STATE_EXPECTED[state_idx]
+
+    # flip_hist[k] = number of shots with k injected errors
+    flip_hist = np.bincount(n_errors, minlength=err_idx.shape[1] + 1)
+
+    # (theta, phi, e1_i, e1_b, ..., e5_i, e5_b) per shot, built as one array
+    columns = np.stack([err_idx, err_basis], axis=2).reshape(shots, -1)
+    trial_args = [tuple(angles) + tuple(errors)
+                  for angles, errors in zip(STATE_ANGLES[state_idx].tolist(), columns.tolist())]
+
+    # ---------------- Syndrome + baseline ----------------
+    if classical:
+        base_meas, flipX, flipZ = pauli_frame_trial(expected, err_idx, err_basis)
+    else:
+        # Shots without injected errors are deterministic (trivial syndrome,
+        # expected readout), so only the noisy ones go to the simulator.
+        noisy = np.nonzero(n_errors > 0)[0]
+        base_meas = expected.copy()
+        flipX = np.zeros(shots, dtype=np.uint8)
+        flipZ = np.zeros(shots, dtype=np.uint8)
+
+        if len(noisy):
+            # Baseline syndromes (cached across calls)
+            codeX0, codeZ0 = reference_syndromes()
+
+            # Shots sorted by argument tuple, so run_grouped sees each unique
+            # tuple as one contiguous run
+            order = np.array(sorted(noisy.tolist(), key=trial_args.__getitem__), dtype=np.intp)
+            # Cut into about `workers` equal chunks, but only where the tuple
+            # changes: each unique tuple stays one task in one worker
+            workers = max_workers or 1
+            starts = [j for j in range(1, len(order))
+                      if trial_args[order[j]] != trial_args[order[j - 1]]]
+            bounds = np.array(starts + [len(order)], dtype=np.intp)
+            targets = np.arange(1, workers) * len(order) // workers
+            cuts = np.unique(bounds[np.searchsorted(bounds, targets)])
+            chunks = [c for c in np.split(order, cuts) if len(c)]
+
+            parts = map_tasks(simulate_trials,
+                              [[trial_args[i] for i in c] for c in chunks],
+                              [n_errors[c].tolist() for c in chunks],
+                              max_workers=workers, warm=warm_trial_tasks)
+            rows = np.concatenate(chunks)
+            base_meas[rows] = np.concatenate([readout for readout, _ in parts])
+
+            # (noisy, 2, 7) probe bits -> one packed word per shot and basis
+            words = pack_bits(np.concatenate([probe_bits for _, probe_bits in parts]))
+            flipX[rows] = syndrome_codes(words[:, 0]) ^ codeX0
+            flipZ[rows] = syndrome_codes(words[:, 1]) ^ codeZ0
+
+    # ---------------- Decode ----------------
+    # One gather over the 64-entry (flipX, flipZ) table
+    codes = (flipX.astype(np.intp) << 3) | flipZ
+    corr_index_arr = CORRECTION_INDEX[codes].astype(np.int64)
+    corr_basis_arr = CORRECTION_BASIS[codes].astype(np.int64)
+
+    # ---------------- Correction ----------------
+    # decode_713_block is Clifford, so the correction Pauli only XORs a fixed
+    # pattern into the readout: apply it to the same shot's baseline readout
+    # instead of re-preparing and re-simulating the block.
+    corrected = corr_index_arr >= 0
+    corr_flip = READOUT_FLIP[np.where(corrected, corr_index_arr, 0), corr_basis_arr]
+    corr_meas = base_meas ^ np.where(corrected, corr_flip, 0)
+
+    # ---------------- Tally ----------------
+    base_meas = np.asarray(base_meas, dtype=np.uint8)
+    corr_meas = np.asarray(corr_meas, dtype=np.uint8)
+
+    baseline_fail = int((base_meas != expected).sum())
+    corr_fail = int((corr_meas != expected).sum())
+
+    # Postselection keeps only shots where neither syndrome fired, i.e. a
+    # zero combined (flipX, flipZ) code
+    accepted_mask = codes == 0
+    post_accept = int(accepted_mask.sum())
+    post_fail = int((base_meas[accepted_mask] != expected[accepted_mask]).sum())
 
     # Results
     baseline_fid = 1 - baseline_fail / shots
     corr_fid = 1 - corr_fail / shots
 
     post_fid = 1 - post_fail / post_accept if post_accept > 0 else 0
-    waste = 1 - post_accept / post_total
+    waste = 1 - post_accept / shots
 
     return baseline_fid, post_fid, waste, corr_fid, flip_hist
 
@@ -310,7 +354,7 @@ def run_modes(p1: float, shots: int = 500):
 # Main
 # ============================================================
 
-def main():
+def main(classical: bool = False):
 
     configs = [
         ("No noise", 0.0, 20),
@@ -325,7 +369,7 @@ def main():
         print(name)
         print("="*70)
 
-        base, post, waste, corr, hist = run_modes(p1, shots)
+        base, post, waste, corr, hist = run_modes(p1, shots, classical)
 
         print(f"Physical error scale p1 = {p1}")
         print(f"Baseline fidelity        = {base:.4f}")
@@ -334,11 +378,9 @@ def main():
         print(f"Corrected fidelity       = {corr:.4f}")
 
         print("\nAverage injected flips per shot:")
-        total = sum(hist.values())
-        for k in sorted(hist.keys()):
-            frac = hist[k] / total
+        for k, frac in enumerate(hist / hist.sum()):
             print(f"  {k} flips: {frac:.3f}")
 
 
 if __name__ == "__main__":
-    main()
+    main(classical="--classical" in sys.argv)
@@ -42,11 +42,47 @@ See slides_notes.txt for detailed explanation.
 """
 
 # qec package initializer - exposes a clean surface for run_demo.py
+from importlib import import_module
+
 from .states import zeroState, oneState, plusState, minusState
-from .encoding import setPhysicalQubit, encode_713_block, decode_713_block, prepareLogicalQubit
+from .encoding import (setPhysicalQubit, encode_713_block, decode_713_block, prepare_zero_713,
+                       prepare_plus_713, prepareLogicalQubit, prepareLogicalZero,
+                       prepareLogicalPlus)
 from .logical_ops import logical_X_roundtrip
 from .errors import inject_pauli
-from .syndrome import measure_clean_syndromes, measure_error_syndromes, verify_correction, measure_X_syndrome, measure_Z_syndrome
-from .error_mapping import color_parities, locate_flipped_qubit
-from .correction import run_full_QEC
-from .experiments import run_noiseless, run_with_noise, postselected_memory_experiment, sweep_logical_error_vs_p
+
+# Everything below pulls in cirq, stim, matplotlib or a simulator instance,
+# so it is imported on first attribute access (PEP 562) instead of with the
+# package: public name -> submodule
+_LAZY = {
+    **dict.fromkeys(["measure_clean_syndromes", "measure_error_syndromes", "verify_correction",
+                     "measure_X_syndrome", "measure_Z_syndrome", "extract_X_syndrome",
+                     "extract_Z_syndrome", "extract_syndromes", "extract_syndromes_into",
+                     "correct_and_verify"], "syndrome"),
+    **dict.fromkeys(["color_parities", "locate_flipped_qubit", "to_bits"], "error_mapping"),
+    **dict.fromkeys(["run_full_QEC", "run_full_QEC_batch", "warm_up"], "correction"),
+    **dict.fromkeys(["get_emu", "bind_task", "run_once", "run_shots", "run_grouped"], "sampling"),
+    **dict.fromkeys(["benchmark_compare_stim", "benchmark_logical_stim", "benchmark_physical_stim",
+                     "STIM_AVAILABLE"], "stim_memory"),
+    **dict.fromkeys(["run_noiseless", "run_with_noise", "postselected_memory_experiment",
+                     "sweep_logical_error_vs_p", "plot_logical_error_by_qubit",
+                     "plot_memory_survival", "plot_logical_error_vs_p"], "experiments"),
+}
+
+__all__ = [
+    "zeroState", "oneState", "plusState", "minusState",
+    "setPhysicalQubit", "encode_713_block", "decode_713_block", "prepare_zero_713",
+    "prepare_plus_713", "prepareLogicalQubit", "prepareLogicalZero", "prepareLogicalPlus",
+    "logical_X_roundtrip", "inject_pauli",
+    *_LAZY,
+]
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{_LAZY[name]}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
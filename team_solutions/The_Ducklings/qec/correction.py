@@ -1,130 +1,210 @@
-from bloqade.pyqrack import StackMemorySimulator
-from bloqade.cirq_utils import emit_circuit
-from .syndrome import measure_clean_syndromes, measure_error_syndromes, verify_correction, apply_cirq_noise_to_kernel
-from .error_mapping import color_parities, locate_flipped_qubit
+from functools import lru_cache
+
+import numpy as np
+from .syndrome import (measure_error_syndromes, correct_and_verify, apply_cirq_noise_to_kernel,
+                       reference_syndromes, verify_reference)
+from .error_mapping import (CORRECTION_BASIS, CORRECTION_INDEX, code_parities,
+                            pack_bits, syndrome_codes, to_bits)
+from .sampling import rng, run_once, run_shots, warm_tasks
+
+# Correction basis (CORRECTION_BASIS) -> Pauli name
+PAULI_NAMES = ("X", "Y", "Z")
+
+@lru_cache(maxsize=None)
+def _syndrome_circuit(theta: float, phi: float, err_index: int, err_basis: int):
+    """Cirq circuit of measure_error_syndromes, emitted once per argument tuple, not per shot."""
+    # Imported here: cirq costs more than the rest of `import qec` together,
+    # and only verbose runs emit a circuit
+    from bloqade.cirq_utils import emit_circuit
+    return emit_circuit(measure_error_syndromes,
+                        args=(theta, phi, err_index, err_basis),
+                        ignore_returns=True)
+
+@lru_cache(maxsize=None)
+def warm_up(theta: float = 0.0, phi: float = 0.0) -> None:
+    """
+    Pay the once-per-process QEC costs for input (theta, phi) up front.
 
-emu = StackMemorySimulator()
+    Builds the simulator tasks of every kernel run_full_QEC / run_full_QEC_batch
+    can dispatch and runs the two reference kernels, so the first timed call
+    (or every sweep worker, via process_pool) starts from warm caches. Not done at import:
+    `import qec` stays cheap for scripts that never simulate.
+    """
+    warm_tasks(measure_error_syndromes, correct_and_verify(*reference_syndromes(theta, phi)))
+    verify_reference(theta, phi)
 
 def run_full_QEC(theta: float, phi: float,
                  err_index: int, err_basis: int,
                  noise_scaling: float = 0.0,
-                 verbose: bool = True):
+                 verbose: bool = True,
+                 verify_rate: float = 1.0):
     """
     Host-side pipeline:
       1) baseline syndromes
       2) inject error and measure syndromes
       3) classical decode to get location+type
       4) apply correction and verify
+
+    Whether the trial will be verified is drawn first: verified trials run
+    steps 2-4 as one correct_and_verify task (decoded and corrected in the
+    kernel), the others only measure the error syndromes.
     
     Returns:
-        (success, circuit): success is bool, circuit is the Cirq circuit used for error syndrome measurement
+        (success, circuit): success is bool, or None when a correction was
+            applied but not verified (its outcome is unknown, so it must not
+            be counted as a success); circuit is the Cirq circuit used for
+            error syndrome measurement (None when verbose=False)
       
     Args:
         noise_scaling: GeminiOneZoneNoiseModel scaling factor (0 = noiseless)
-        verbose: Print detailed syndrome info (default True)
+        verbose: Print detailed syndrome info and emit the circuit (default True)
+        verify_rate: Fraction of applied corrections that are re-measured
+            (default 1.0). Estimate error rates from the verified trials only.
     """
     
-    print("\n======================================")
-    print("Injected error:", ["X", "Y", "Z"][err_basis], "on qubit", err_index)
-    print("======================================")
+    if not (-1 <= err_index < 7 and 0 <= err_basis <= 2):
+        raise ValueError(f"invalid error (index={err_index}, basis={err_basis}); "
+                         "expected index in -1..6 and basis in 0..2")
+
+    if verbose:
+        print("\n======================================")
+        print("Injected error:", ["X", "Y", "Z"][err_basis], "on qubit", err_index)
+        print("======================================")
     
-    # Emit the circuit for visualization
-    circuit = emit_circuit(measure_error_syndromes,
-                          args=(theta, phi, err_index, err_basis),
-                          ignore_returns=True)
+    # Emit the circuit for visualization (cached: sweeps repeat the same
+    # arguments); quiet runs never look at it
+    circuit = _syndrome_circuit(theta, phi, err_index, err_basis) if verbose else None
     
     # --------------------------------------------------------
     # Step 1: Baseline syndrome measurement
     # --------------------------------------------------------
     
-    baseX, baseZ = list(emu.task(measure_clean_syndromes,
-                                 args=(theta, phi)).batch_run(shots=1))[0]
+    # Deterministic for a given input state: cached across calls and sweeps
+    codeX0, codeZ0 = reference_syndromes(theta, phi)
 
-    synX0 = color_parities([int(b) for b in baseX])
-    synZ0 = color_parities([int(b) for b in baseZ])
+    synX0 = code_parities(codeX0)
+    synZ0 = code_parities(codeZ0)
 
-    print("Baseline X syndrome:", synX0)
-    print("Baseline Z syndrome:", synZ0)
+    if verbose:
+        print("Baseline X syndrome:", synX0)
+        print("Baseline Z syndrome:", synZ0)
 
     # --------------------------------------------------------
     # Step 2: Syndrome after injected error
     # --------------------------------------------------------
 
+    # Verified trials run the fused inject/decode/correct/verify kernel, which
+    # also returns the error syndromes decoded below. Drawing the decision
+    # before the correction is known keeps it at verify_rate per correction.
+    verify = verify_rate >= 1.0 or rng.random() < verify_rate
+    kernel = correct_and_verify(codeX0, codeZ0) if verify else measure_error_syndromes
+
     # Use noisy or noiseless syndrome measurement
     if noise_scaling > 0:
-        noisy_measure = apply_cirq_noise_to_kernel(measure_error_syndromes, noise_scaling)
-        measX, measZ = list(emu.task(noisy_measure,
-                                     args=(theta, phi, err_index, err_basis)).batch_run(shots=1))[0]
-    else:
-        measX, measZ = list(emu.task(measure_error_syndromes,
-                                     args=(theta, phi, err_index, err_basis)).batch_run(shots=1))[0]
-
-    synX1 = color_parities([int(b) for b in measX])
-    synZ1 = color_parities([int(b) for b in measZ])
+        kernel = apply_cirq_noise_to_kernel(kernel, noise_scaling)
+    meas = run_once(kernel, (theta, phi, err_index, err_basis))
 
-    x_guess = locate_flipped_qubit(synX0, synX1)
-    z_guess = locate_flipped_qubit(synZ0, synZ1)
+    # Both probes in one (2, 7) array -> two packed syndrome codes
+    codeX1, codeZ1 = syndrome_codes(pack_bits(to_bits(meas[:2]))).tolist()
+    synX1 = code_parities(codeX1)
+    synZ1 = code_parities(codeZ1)
 
-    print("\nAfter error injection:")
-    print("X syndrome:", synX1)
-    print("Z syndrome:", synZ1)
+    if verbose:
+        print("\nAfter error injection:")
+        print("X syndrome:", synX1)
+        print("Z syndrome:", synZ1)
 
     # --------------------------------------------------------
     # Step 3: Classify Pauli type
     # --------------------------------------------------------
 
-    # classify Pauli
-    if x_guess != -1 and z_guess != -1:
-        etype, qloc = "Y", x_guess
-    elif x_guess != -1:
-        etype, qloc = "X", x_guess
-    elif z_guess != -1:
-        etype, qloc = "Z", z_guess
-    else:
-        etype, qloc = "None", -1
+    # Location and Pauli from the 64-entry (flipX, flipZ) decoder table, the
+    # same one run_full_QEC_batch reads
+    code = (codeX1 ^ codeX0) << 3 | (codeZ1 ^ codeZ0)
+    qloc = int(CORRECTION_INDEX[code])
+    etype = PAULI_NAMES[CORRECTION_BASIS[code]] if qloc >= 0 else "None"
 
-    print("\nDetected error:", etype, "on qubit", qloc)
+    if verbose:
+        print("\nDetected error:", etype, "on qubit", qloc)
 
     if etype == "None":
-        print("No correction needed.")
-        return True
+        if verbose:
+            print("No correction needed.")
+        return True, circuit
 
-    corr_basis = {"X": 0, "Y": 1, "Z": 2}[etype]
+    if not verify:
+        if verbose:
+            print("Verification skipped: outcome unknown.")
+        return None, circuit
 
     # --------------------------------------------------------
     # Step 4: Verify correction restores baseline
     # --------------------------------------------------------
 
-    # Use noisy or noiseless verification
-    if noise_scaling > 0:
-        noisy_verify = apply_cirq_noise_to_kernel(verify_correction, noise_scaling)
-        measX2, measZ2 = list(emu.task(
-            noisy_verify,
-            args=(theta, phi,
-                  err_index, err_basis,
-                  qloc, corr_basis)
-        ).batch_run(shots=1))[0]
-    else:
-        measX2, measZ2 = list(emu.task(
-            verify_correction,
-            args=(theta, phi,
-                  err_index, err_basis,
-                  qloc, corr_basis)
-        ).batch_run(shots=1))[0]
-
-    synX2 = color_parities([int(b) for b in measX2])
-    synZ2 = color_parities([int(b) for b in measZ2])
-
-    print("\nAfter correction:")
-    print("X syndrome:", synX2)
-    print("Z syndrome:", synZ2)
+    # Already corrected and re-measured in the same task. The second round
+    # has its own error-free codes; show it in the baseline's signs
+    refX2, refZ2 = verify_reference(theta, phi)
+    codeX2, codeZ2 = syndrome_codes(pack_bits(to_bits(meas[2:]))).tolist()
+    synX2 = code_parities(codeX2 ^ refX2 ^ codeX0)
+    synZ2 = code_parities(codeZ2 ^ refZ2 ^ codeZ0)
 
     success = (synX2 == synX0 and synZ2 == synZ0)
     
-    if success:
-        print("\n✅ Correction successful.")
-    else:
-        print("\n❌ Correction failed.")
+    if verbose:
+        print("\nAfter correction:")
+        print("X syndrome:", synX2)
+        print("Z syndrome:", synZ2)
+        print("\n✅ Correction successful." if success else "\n❌ Correction failed.")
     
     return success, circuit 
 
+
+
+def _syndrome_codes(meas: np.ndarray, codeX0: int, codeZ0: int) -> np.ndarray:
+    """Combined flip codes flipX << 3 | flipZ of (shots, 2, 7) (measX, measZ) bits."""
+    flipX = syndrome_codes(pack_bits(meas[:, 0])) ^ codeX0
+    flipZ = syndrome_codes(pack_bits(meas[:, 1])) ^ codeZ0
+    return (flipX << 3) | flipZ
+
+def run_full_QEC_batch(theta: float, phi: float,
+                       err_index: int, err_basis: int,
+                       shots: int,
+                       noise_scaling: float = 0.0,
+                       verify_rate: float = 1.0) -> np.ndarray:
+    """
+    run_full_QEC for `shots` trials at once, without the per-shot prints.
+
+    Each trial is verified with probability verify_rate. Only the verified
+    trials are simulated, all of them as one correct_and_verify task; the
+    others are not run at all and count as neither success nor failure, so
+    the logical error rate is 1 - success.sum() / verified.sum(). Noiseless
+    trials without an injected error read the reference syndromes and need
+    no correction, so every verified one succeeds without a simulation.
+
+    Returns:
+        (success, verified): (shots,) bool arrays; success is only set on
+        verified trials, where it is the flag run_full_QEC would return
+    """
+    if not (-1 <= err_index < 7 and 0 <= err_basis <= 2):
+        raise ValueError(f"invalid error (index={err_index}, basis={err_basis}); "
+                         "expected index in -1..6 and basis in 0..2")
+
+    if verify_rate >= 1.0:
+        verified = np.ones(shots, dtype=bool)
+    else:
+        verified = rng.random(shots) < verify_rate
+    success = verified.copy()
+    n_verified = int(verified.sum())
+    if n_verified == 0 or (err_index < 0 and noise_scaling <= 0):
+        return success, verified
+
+    codeX0, codeZ0 = reference_syndromes(theta, phi)
+    fused = correct_and_verify(codeX0, codeZ0)
+    if noise_scaling > 0:
+        fused = apply_cirq_noise_to_kernel(fused, noise_scaling)
+    meas = to_bits(run_shots(fused, (theta, phi, err_index, err_basis), n_verified))
+    corrected = CORRECTION_INDEX[_syndrome_codes(meas[:, :2], codeX0, codeZ0)] >= 0
+    # The verification round is checked against its own error-free codes
+    restored = _syndrome_codes(meas[:, 2:], *verify_reference(theta, phi)) == 0
+    success[verified] = ~corrected | restored
+    return success, verified
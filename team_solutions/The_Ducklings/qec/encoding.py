@@ -74,3 +74,65 @@ def prepareLogicalQubit(theta: float, phi: float) -> IList[Qubit, Any]:
     setPhysicalQubit(theta, phi, reg[6])
     encode_713_block(reg)
     return reg
+
+# Direct |0_L> preparation for a register in |0000000>: the same stabilizer
+# state as encode_713_block, in 14 gates instead of 24. H on one pivot qubit
+# per color (BLUE 0, GREEN 5, RED 6) and CNOT fan-outs over the rest of its
+# support give the uniform superposition of the X-stabilizer group; X on
+# qubit 3 moves it to the encoder's (odd-weight) coset and Z on qubit 0
+# matches the encoder's X-stabilizer signs.
+@squin.kernel
+def prepare_zero_713(reg: IList[Qubit, Any]) -> None:
+    for i in (0, 5, 6):
+        squin.h(reg[i])
+
+    for i in (1, 2, 3):
+        squin.cx(reg[0], reg[i])
+    for i in (1, 2, 4):
+        squin.cx(reg[5], reg[i])
+    for i in (2, 3, 4):
+        squin.cx(reg[6], reg[i])
+
+    squin.x(reg[3])
+    squin.z(reg[0])
+
+# Fixed |0_L> preparation: the input state is known, so skip the generic
+# encoder and prepare the stabilizer state directly.
+# Used for every |0_L> probe and |0_L> memory block.
+@squin.kernel
+def prepareLogicalZero() -> IList[Qubit, Any]:
+    reg = squin.qalloc(7)
+    prepare_zero_713(reg)
+    return reg
+
+# Direct preparation of the |+_L> probe state, i.e. exactly the state
+# prepareLogicalQubit(0.0, pi/2) produces, in 22 gates instead of 26. H on
+# one pivot per X-type generator (BLUE 0, logical 4, GREEN 5, RED 6, fan-outs
+# reduced so no pivot is another's target) spans the code space in |+_L>;
+# the transversal S^dag then rotates it onto the encoder's input
+# rx(pi/2)|0>, and X on qubit 3 / Z on qubit 0 fix the signs as in
+# prepare_zero_713.
+@squin.kernel
+def prepare_plus_713(reg: IList[Qubit, Any]) -> None:
+    for i in (0, 4, 5, 6):
+        squin.h(reg[i])
+
+    for i in (1, 2, 3):
+        squin.cx(reg[0], reg[i])
+    for i in (1, 3):
+        squin.cx(reg[4], reg[i])
+    for i in (2, 3):
+        squin.cx(reg[5], reg[i])
+    for i in (1, 2):
+        squin.cx(reg[6], reg[i])
+
+    squin.broadcast.s_adj(reg)
+    squin.x(reg[3])
+    squin.z(reg[0])
+
+# Fixed |+_L> preparation for the X-syndrome probes
+@squin.kernel
+def prepareLogicalPlus() -> IList[Qubit, Any]:
+    reg = squin.qalloc(7)
+    prepare_plus_713(reg)
+    return reg
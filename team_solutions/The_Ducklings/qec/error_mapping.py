@@ -1,35 +1,129 @@
+from collections.abc import Sequence
+from itertools import chain
+from math import prod
 from typing import List, Tuple
 
+import numpy as np
+
 # Stabilizer supports for the [[7,1,3]] color code
 RED   = [2, 3, 4, 6]
 GREEN = [1, 2, 4, 5]
 BLUE  = [0, 1, 2, 3]
 
+# (3, 4) index array, rows ordered (R, G, B)
+COLOR_SUPPORTS = np.array([RED, GREEN, BLUE])
+
+# (3, 7) parity-check matrix over GF(2), same rows
+COLOR_CHECKS = np.zeros((3, 7), dtype=np.uint8)
+for row, support in enumerate(COLOR_SUPPORTS):
+    COLOR_CHECKS[row, support] = 1
+
 def parity(bits: List[int], support: List[int]) -> int:
     """Return +1 for even parity, -1 for odd parity on support."""
-    return +1 if sum(bits[i] for i in support) % 2 == 0 else -1
-
-def color_parities(bits: List[int]) -> Tuple[int, int, int]:
-    """Return stabilizer parities (R,G,B)."""
-    return (
-        parity(bits, RED),
-        parity(bits, GREEN),
-        parity(bits, BLUE),
-    )
-
-# Syndrome flip pattern -> qubit index (classical single-error decoder)
-SYNDROME_TABLE = {
-    (0, 0, 0): -1,  # no error
-    (0, 0, 1): 0,
-    (0, 1, 1): 1,
-    (1, 1, 1): 2,
-    (1, 0, 1): 3,
-    (1, 1, 0): 4,
-    (0, 1, 0): 5,
-    (1, 0, 0): 6,
-}
+    return 1 - 2 * int(np.bitwise_xor.reduce(np.asarray(bits, dtype=np.uint8)[support]))
+
+def color_parities(bits):
+    """
+    Return stabilizer parities (R,G,B) as +1 (even) / -1 (odd).
+
+    One shot of shape (7,) gives a tuple; a batch of shape (shots, 7) gives
+    a (shots, 3) int8 array in one pass.
+    """
+    parity_bits = (np.asarray(bits, dtype=np.uint8) @ COLOR_CHECKS.T) & 1
+    signs = 1 - 2 * parity_bits.astype(np.int8)
+    return tuple(signs.tolist()) if signs.ndim == 1 else signs
+
+def to_bits(meas) -> np.ndarray:
+    """
+    Convert measurement results to a uint8 array in a single pass.
+
+    Takes one measurement IList (or any bit sequence), or a nested batch such
+    as run_shots output of shape (shots, ..., 7). Nested batches are
+    flattened and read with one np.fromiter call, which skips the per-element
+    dispatch np.asarray does on lists of MeasurementResultValue.
+    """
+    if isinstance(meas, np.ndarray):
+        return meas.astype(np.uint8, copy=False)
+    shape = [len(meas)]
+    row = meas
+    while len(row) and isinstance(row[0], Sequence):
+        row = row[0]
+        shape.append(len(row))
+    flat = meas
+    for _ in range(len(shape) - 1):
+        flat = chain.from_iterable(flat)
+    return np.fromiter(flat, dtype=np.uint8, count=prod(shape)).reshape(shape)
 
 def locate_flipped_qubit(old_syn, new_syn) -> int:
     """Compare parity change and infer likely X error location."""
-    flip = tuple(1 if old_syn[i] != new_syn[i] else 0 for i in range(3))
-    return SYNDROME_TABLE.get(flip, -1)
+    # Branchless 3-bit index R<<2 | G<<1 | B into the 8-entry SYNDROME_TABLE
+    code = (((old_syn[0] != new_syn[0]) << 2)
+            | ((old_syn[1] != new_syn[1]) << 1)
+            | (old_syn[2] != new_syn[2]))
+    return SYNDROME_TABLE[code]
+
+# ---------------------------------------------------------------------------
+# Packed-word decoder: bit i of a uint8 word holds qubit i's outcome
+# ---------------------------------------------------------------------------
+
+# Syndrome code flipped by an error on each qubit: column q of COLOR_CHECKS
+# read as R<<2 | G<<1 | B, i.e. every entry of SYNDROME_TABLE derived from
+# the stabilizer supports by enumerating the 7 single-qubit errors
+QUBIT_SYNDROME = (
+    (COLOR_CHECKS.T << np.array([2, 1, 0], dtype=np.uint8)).sum(axis=1).astype(np.uint8)
+)
+
+# Packed word (7 bits) -> syndrome code: the XOR of QUBIT_SYNDROME over the
+# word's set bits, so decoding a batch of words is one gather
+WORD_SYNDROME = np.bitwise_xor.reduce(
+    np.where((np.arange(128)[:, None] >> np.arange(7)) & 1, QUBIT_SYNDROME, 0), axis=1
+).astype(np.uint8)
+
+# Syndrome flip code -> qubit index (inverse of QUBIT_SYNDROME, -1 = no error)
+LOCATE = np.full(8, -1, dtype=np.int8)
+LOCATE[QUBIT_SYNDROME] = np.arange(7)
+
+# Same decoder as a tuple of Python ints, for the single-shot path:
+# SYNDROME_TABLE[0b001] = 0, [0b011] = 1, [0b111] = 2, ...
+SYNDROME_TABLE = tuple(LOCATE.tolist())
+
+# Combined decoder, indexed by flipX << 3 | flipZ: the correction Pauli
+# (index, basis) with basis 0 = X, 1 = Y, 2 = Z. Both syndromes firing is
+# read as a Y on the X location; index -1 means no correction.
+CORRECTION_INDEX = np.full(64, -1, dtype=np.int8)
+CORRECTION_BASIS = np.zeros(64, dtype=np.uint8)
+for x in range(8):
+    for z in range(8):
+        xq, zq = LOCATE[x], LOCATE[z]
+        if xq >= 0:
+            CORRECTION_INDEX[x << 3 | z] = xq
+            CORRECTION_BASIS[x << 3 | z] = 1 if zq >= 0 else 0
+        elif zq >= 0:
+            CORRECTION_INDEX[x << 3 | z] = zq
+            CORRECTION_BASIS[x << 3 | z] = 2
+
+# READOUT_FLIP[q, basis] (basis 0 = X, 1 = Y, 2 = Z): whether that Pauli on
+# data qubit q flips the qubit-6 readout after decode_713_block, i.e. the
+# qubit-6 X component of decode . P . decode^-1. Pauli products XOR together.
+READOUT_FLIP = np.array([
+    [0, 0, 0],
+    [0, 0, 0],
+    [0, 0, 0],
+    [0, 0, 0],
+    [1, 1, 0],
+    [1, 1, 0],
+    [1, 1, 0],
+], dtype=np.uint8)
+
+def pack_bits(bits) -> np.ndarray:
+    """Pack (..., 7) measurement bits into uint8 words, qubit i -> bit i."""
+    arr = np.asarray(bits, dtype=np.uint8)
+    return np.packbits(arr, axis=-1, bitorder="little")[..., 0]
+
+def syndrome_codes(words) -> np.ndarray:
+    """3-bit syndrome code R<<2 | G<<1 | B of packed words (0 = all parities even)."""
+    return WORD_SYNDROME[np.asarray(words, dtype=np.uint8)]
+
+def code_parities(code: int) -> Tuple[int, int, int]:
+    """Inverse of syndrome_codes for one shot: (R,G,B) parities as +/-1, like color_parities."""
+    return tuple(1 - 2 * ((int(code) >> shift) & 1) for shift in (2, 1, 0))
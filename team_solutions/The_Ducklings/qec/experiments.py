@@ -1,21 +1,33 @@
-import matplotlib.pyplot as plt
+from functools import lru_cache, partial
+
 import numpy as np
-from bloqade.pyqrack import StackMemorySimulator
 
 from .logical_ops import logical_X_roundtrip
-from .correction import run_full_QEC
-from .states import zeroState, plusState, oneState
-from .error_mapping import color_parities, locate_flipped_qubit
-from .syndrome import measure_clean_syndromes
+from .correction import run_full_QEC_batch, warm_up
+from .error_mapping import pack_bits, syndrome_codes, to_bits
+from .sampling import bind_task, map_tasks, rng, run_shots, warm_tasks
+from .syndrome import measure_clean_syndromes, reference_syndromes
+
+def _subplots(**fig_kw):
+    """(fig, ax) on a standalone Figure; saved without pyplot, so the global backend is kept."""
+    from matplotlib.figure import Figure
+    fig = Figure(**fig_kw)
+    return fig, fig.subplots()
 
 # Simple noiseless / noisy wrappers for convenience
 def run_noiseless(theta, phi, shots=200):
-    emu = StackMemorySimulator()
-    task = emu.task(logical_X_roundtrip, args=(theta, phi))
+    # Shared process-wide simulator (qec.sampling.get_emu)
+    task = bind_task(logical_X_roundtrip, (theta, phi))
     print("\n=== Noiseless Simulation ===")
     print(task.batch_run(shots=shots))
 
-def run_with_noise(theta, phi, shots=200):
+@lru_cache(maxsize=None)
+def _noisy_roundtrip_sampler(theta, phi):
+    """
+    Compiled Stim sampler of the Gemini-noised logical_X_roundtrip(theta, phi).
+
+    Built once per state.
+    """
     # Use bloqade.cirq_utils.emit + noise models if available
     import bloqade.stim
     from bloqade.cirq_utils import noise
@@ -28,37 +40,79 @@ def run_with_noise(theta, phi, shots=200):
     noisy_kernel = load_circuit(noisy_cirq)
 
     stim_circ = bloqade.stim.Circuit(noisy_kernel)
-    sampler = stim_circ.compile_sampler()
-    samples = sampler.sample(shots=shots)
+    return stim_circ.compile_sampler()
+
+def run_with_noise(theta, phi, shots=200):
+    # Emit -> noise -> load -> Stim compile only on the first call per state
+    samples = _noisy_roundtrip_sampler(theta, phi).sample(shots=shots)
     print("\n=== Noisy Gemini Simulation ===")
     print(samples)
 
 # Post-selection experiment: prepare, measure syndromes, accept only shots with trivial syndromes
-def postselected_memory_experiment(theta, phi, shots, measure_syndrome_task):
+def _trivial_syndrome_shots(theta, phi, measure_syndrome_task, batch):
+    """Run `batch` shots in one task; return the probe-bit rows with a trivial syndrome."""
+    # Each result is a tuple (measX, measZ) or single probe depending on the
+    # kernel; flatten to one row of probe bits per shot
+    results = run_shots(measure_syndrome_task, (theta, phi, 0, 0), batch)
+    probe_bits = to_bits(results).reshape(len(results), -1)
+    # accept trivial syndromes (all probe bits zero)
+    return probe_bits[~probe_bits.any(axis=1)]
+
+def postselected_memory_experiment(theta, phi, shots, measure_syndrome_task, attempts=None):
     """
     measure_syndrome_task should be a kernel that returns the probe measurement bits (length 7)
     This function demonstrates host-side post-selection: re-run until you collect the requested
     number of accepted shots (i.e. trivial syndrome).
+
+    With `attempts` given, run exactly that many shots as one batch instead and keep
+    every accepted one (up to `shots`); the acceptance rate is accepted / attempts.
+
+    Otherwise shots are rejection-sampled in batches of one task each, within
+    a budget of 100 * shots attempts. The first batch is `shots` long; every
+    later one is twice the missing shots over the acceptance rate seen so
+    far, so even a low rate needs only a few dispatches. While nothing has
+    been accepted the rate counts one acceptance, so after an empty first
+    batch the second asks for 2 * shots**2 attempts and is trimmed to the
+    rest of the budget (all of it from shots = 50 on). Batches are not padded
+    to a minimum size: every shot is simulated, so oversized batches cost
+    more than the extra dispatch they save.
     """
-    emu = StackMemorySimulator()
+    if attempts is not None:
+        accepted = _trivial_syndrome_shots(theta, phi, measure_syndrome_task,
+                                           attempts)[:shots].tolist()
+        print(f"Collected {len(accepted)} accepted shots after {attempts} attempts")
+        return accepted
+
     accepted = []
     attempts = 0
-    while len(accepted) < shots and attempts < shots * 100:
-        attempts += 1
-        res = list(emu.task(measure_syndrome_task, args=(theta, phi, 0, 0)).batch_run(shots=1))[0]
-        # res is a tuple (measX, measZ) or single probe depending on the kernel
-        # Here assume kernel returns probe measurement bits for one probe (7 bits)
-        probe_bits = list(res)
-        # compute parity and decide accept (trivial syndrome = all zeros)
-        if all(int(b) == 0 for b in probe_bits):
-            accepted.append(probe_bits)
+    max_attempts = shots * 100
+    while len(accepted) < shots and attempts < max_attempts:
+        # Overcommit by the acceptance rate seen so far so that most runs need
+        # a single re-dispatch instead of many short top-up batches
+        missing = shots - len(accepted)
+        if attempts:
+            rate = max(len(accepted), 1) / attempts
+            batch = int(np.ceil(2 * missing / rate))
+        else:
+            batch = missing
+        batch = min(batch, max_attempts - attempts)
+        attempts += batch
+        accepted.extend(_trivial_syndrome_shots(theta, phi, measure_syndrome_task,
+                                                batch)[:missing].tolist())
     print(f"Collected {len(accepted)} accepted shots after {attempts} attempts")
     return accepted
 
 # ==============================================================================
 # PHASE 1: Sweep logical error (noiseless baseline + deterministic errors)
 # ==============================================================================
-def sweep_logical_error_vs_noise_scaling(shots_per_point=50, verbose=True):
+def _y_error_successes(qubit, shots, verify_rate=1.0):
+    """Process-pool entry point: (successful, verified) QEC runs with a Y error on `qubit`."""
+    # All shots in one batch: |0⟩ state, Y error (basis 1) on this qubit, noiseless
+    success, verified = run_full_QEC_batch(0.0, 0.0, qubit, 1, shots, verify_rate=verify_rate)
+    return int(success.sum()), int(verified.sum())
+
+def sweep_logical_error_vs_noise_scaling(shots_per_point=50, verbose=True, max_workers=None,
+                                         verify_rate=1.0, plot=True):
     """
     Sweep QEC performance by varying injected error positions and types.
     Demonstrates logical error characterization as required by challenge.
@@ -73,6 +127,10 @@ def sweep_logical_error_vs_noise_scaling(shots_per_point=50, verbose=True):
     Args:
         shots_per_point: Number of QEC runs per noise scaling level
         verbose: Print progress
+        max_workers: Processes for the per-qubit points (default: CPU count, at most 7)
+        verify_rate: Fraction of runs verified (see run_full_QEC_batch); the
+            error rate of each qubit is estimated from its verified runs only
+        plot: Save logical_error_by_qubit.png (plot_logical_error_by_qubit)
         
     Returns:
         error_counts, logical_error_rates (for plotting)
@@ -86,49 +144,57 @@ def sweep_logical_error_vs_noise_scaling(shots_per_point=50, verbose=True):
     print("="*70)
     print(f"Running {shots_per_point} shots per qubit...\n")
     
-    for qubit in error_qubits:
-        print(f"  Testing qubit {qubit}...", end=' ', flush=True)
-        successes = 0
-        for shot in range(shots_per_point):
-            try:
-                success = run_full_QEC(
-                    theta=0.0, phi=0.0,  # |0⟩ state
-                    err_index=qubit,     # Y error on this qubit
-                    err_basis=1,         # 1 = Y
-                    noise_scaling=0.0,   # Noiseless for baseline characterization
-                    verbose=False        # No per-shot prints
-                )
-                if success:
-                    successes += 1
-            except Exception as e:
-                if verbose and shot == 0:
-                    print(f"\n    Warning: {e}")
-        
-        logical_error = 1.0 - (successes / shots_per_point)
+    # Qubits are independent: one process-pool task per qubit, each worker
+    # building its tasks and references once
+    counts = map_tasks(_y_error_successes, error_qubits, [shots_per_point] * len(error_qubits),
+                       [verify_rate] * len(error_qubits), max_workers=max_workers, warm=warm_up)
+    for qubit, (successes, verified) in zip(error_qubits, counts):
+        logical_error = 1.0 - successes / verified if verified else float("nan")
         logical_errors_by_qubit.append(logical_error)
         status = "✓" if logical_error < 0.5 else "✗"
-        print(f"{successes}/{shots_per_point} → error={logical_error:.3f} {status}")
+        if verbose:
+            print(f"  Testing qubit {qubit}... {successes}/{verified} verified "
+                  f"→ error={logical_error:.3f} {status}")
     
-    # Plot
-    plt.figure(figsize=(10, 6))
-    plt.bar(error_qubits, logical_errors_by_qubit, color='steelblue', alpha=0.7)
-    plt.xlabel("Qubit Index", fontsize=12)
-    plt.ylabel("Logical Error Rate (Y error injected)", fontsize=12)
-    plt.title("QEC Performance: Error Detection Capability by Qubit", fontsize=14)
-    plt.grid(True, alpha=0.3, axis='y')
-    plt.tight_layout()
-    plt.savefig("logical_error_by_qubit.png", dpi=150)
-    print("\nPlot saved as: logical_error_by_qubit.png")
-    plt.show()
+    if plot:
+        plot_logical_error_by_qubit(error_qubits, logical_errors_by_qubit)
     
     return error_qubits, logical_errors_by_qubit
 
+def plot_logical_error_by_qubit(error_qubits, logical_errors_by_qubit,
+                                out="logical_error_by_qubit.png"):
+    """Bar chart of sweep_logical_error_vs_noise_scaling's per-qubit error rates."""
+    fig, ax = _subplots(figsize=(10, 6))
+    ax.bar(error_qubits, logical_errors_by_qubit, color='steelblue', alpha=0.7)
+    ax.set_xlabel("Qubit Index", fontsize=12)
+    ax.set_ylabel("Logical Error Rate (Y error injected)", fontsize=12)
+    ax.set_title("QEC Performance: Error Detection Capability by Qubit", fontsize=14)
+    ax.grid(True, alpha=0.3, axis='y')
+    fig.tight_layout()
+    fig.savefig(out, dpi=150)
+    print(f"\nPlot saved as: {out}")
+
 
 # ==============================================================================
 # PHASE 2: Multi-round logical qubit memory
 # ==============================================================================
+def _warm_clean_syndromes(theta, phi):
+    """process_pool warm-up of multi_round_memory_experiment: its task and reference syndromes."""
+    warm_tasks(measure_clean_syndromes)
+    reference_syndromes(theta, phi)
+
+def _clean_successes(theta, phi, shots):
+    """Process-pool entry point: error-free rounds with a trivial syndrome out of `shots`."""
+    # With no injected error there is nothing to decode or correct: a round
+    # survives iff both syndromes match the reference, all shots in one task
+    codeX0, codeZ0 = reference_syndromes(theta, phi)
+    words = pack_bits(to_bits(run_shots(measure_clean_syndromes, (theta, phi), shots)))
+    trivial = (syndrome_codes(words[:, 0]) == codeX0) & (syndrome_codes(words[:, 1]) == codeZ0)
+    return int(trivial.sum())
+
 def multi_round_memory_experiment(theta=0.0, phi=0.0, rounds=5, 
-                                  noise_scaling=1.0, shots=100, verbose=True):
+                                  noise_scaling=1.0, shots=100, verbose=True, max_workers=None,
+                                  plot=True):
     """
     Multi-round QEC memory test: Encode a logical qubit and keep it alive 
     through repeated rounds of syndrome extraction, decoding, and correction.
@@ -144,6 +210,8 @@ def multi_round_memory_experiment(theta=0.0, phi=0.0, rounds=5,
         noise_scaling: Parameter (currently noiseless implementation)
         shots: Number of trials
         verbose: Print progress
+        max_workers: Processes for the rounds (default: CPU count, at most `rounds`)
+        plot: Save the survival curve (plot_memory_survival)
         
     Returns:
         success_counts (list of length rounds+1 showing successes per round)
@@ -156,88 +224,76 @@ def multi_round_memory_experiment(theta=0.0, phi=0.0, rounds=5,
     success_counts = [0] * (rounds + 1)
     success_counts[0] = shots  # 100% at round 0 (just after encoding)
     
-    for round_num in range(1, rounds + 1):
-        print(f"  Round {round_num}...", end=' ', flush=True)
-        survived = 0
-        
-        for shot in range(shots):
-            try:
-                # Each round: encode fresh → measure clean syndromes → verify baseline
-                success = run_full_QEC(
-                    theta=theta, phi=phi,
-                    err_index=-1,        # No deliberate error; just measure
-                    err_basis=0,
-                    noise_scaling=0.0,   # Noiseless for baseline
-                    verbose=False        # No per-shot prints
-                )
-                
-                if success:
-                    survived += 1
-                    
-            except Exception as e:
-                if verbose and shot == 0:
-                    print(f"\n    Warning: {e}")
-        
+    # Every shot of every round is independent: one process-pool task per round
+    counts = map_tasks(_clean_successes, [theta] * rounds, [phi] * rounds, [shots] * rounds,
+                       max_workers=max_workers, warm=partial(_warm_clean_syndromes, theta, phi))
+    for round_num, survived in enumerate(counts, start=1):
         success_counts[round_num] = survived
         prob = survived / shots
-        print(f"{survived}/{shots} survived ({prob:.1%})")
+        if verbose:
+            print(f"  Round {round_num}... {survived}/{shots} survived ({prob:.1%})")
     
-    # Plot survival curve
-    survival_probs = [s / shots for s in success_counts]
-    plt.figure(figsize=(10, 6))
-    plt.plot(range(len(survival_probs)), survival_probs, 'o-', linewidth=2, markersize=8, 
-             color='darkgreen')
-    plt.xlabel("Round", fontsize=12)
-    plt.ylabel("Success Probability", fontsize=12)
-    plt.title(f"Logical Qubit Memory: {rounds} Rounds (Noiseless)", fontsize=14)
-    plt.grid(True, alpha=0.3)
-    plt.ylim([0, 1.05])
-    plt.tight_layout()
-    plt.savefig(f"memory_survival_rounds={rounds}.png", dpi=150)
-    print(f"\nPlot saved as: memory_survival_rounds={rounds}.png")
-    plt.show()
+    if plot:
+        plot_memory_survival(success_counts, shots)
     
     return success_counts
 
+def plot_memory_survival(success_counts, shots, out=None):
+    """
+    Survival curve of multi_round_memory_experiment.
+
+    Saved to `out`, by default memory_survival_rounds=<rounds>.png.
+    """
+    rounds = len(success_counts) - 1
+    out = out or f"memory_survival_rounds={rounds}.png"
+    survival_probs = [s / shots for s in success_counts]
+    fig, ax = _subplots(figsize=(10, 6))
+    ax.plot(range(len(survival_probs)), survival_probs, 'o-', linewidth=2, markersize=8, 
+            color='darkgreen')
+    ax.set_xlabel("Round", fontsize=12)
+    ax.set_ylabel("Success Probability", fontsize=12)
+    ax.set_title(f"Logical Qubit Memory: {rounds} Rounds (Noiseless)", fontsize=14)
+    ax.grid(True, alpha=0.3)
+    ax.set_ylim([0, 1.05])
+    fig.tight_layout()
+    fig.savefig(out, dpi=150)
+    print(f"\nPlot saved as: {out}")
+
 
 # Sweep logical error vs physical error (toy demonstration: vary global error parameter p)
-def sweep_logical_error_vs_p(p_list, shots_per_point=200, state=(0.0, 0.0)):
+def sweep_logical_error_vs_p(p_list, shots_per_point=200, state=(0.0, 0.0), plot=True):
     """
     This is a high-level host driver:
     - for each p (global physical error strength) apply a simple stochastic Pauli
       injection strategy across the encoding circuit and measure logical failure.
     NOTE: This function is a simple demo and uses a toy noise model (random Pauli insertion).
     For rigorous results use the Cirq/Gemini noise pipeline already available.
+    plot=True saves logical_error_vs_p.png (plot_logical_error_vs_p).
+    `state` is unused and kept only for call compatibility: the toy failure
+    flag never depends on the input state.
     """
-    emu = StackMemorySimulator()
-
-    def sample_logical_failure(p):
-        failures = 0
-        for _ in range(shots_per_point):
-            # For speed, reuse the logical_X_roundtrip kernel (noisy behavior must be inserted
-            # via a proper noise model; here we illustrate a very small-scale toy approach)
-            # We simply call the noiseless kernel and then randomly flip the decoded bit with
-            # probability ~ p to mimic physical errors — **toy only**.
-            res = list(emu.task(logical_X_roundtrip, args=state).batch_run(shots=1))[0]
-            # res is measured bits — coarse heuristic to determine logical flip
-            # If decoded physical qubit (index 6) is 1 -> treat as logical flip
-            # For the toy model, flip it randomly with probability p
-            import random
-            if random.random() < p:
-                failures += 1
-        return failures / shots_per_point
-
+    # Toy model: a failure is a Bernoulli(p) draw — **toy only**. The
+    # noiseless logical_X_roundtrip this used to run was never read (its bits
+    # were discarded), so no simulator task is needed: one draw covers every
+    # (p, shot).
+    p_arr = np.asarray(p_list, dtype=float)
+    flips = rng.random((len(p_arr), shots_per_point)) < p_arr[:, None]
     results = []
-    for p in p_list:
+    for p, rate in zip(p_list, flips.mean(axis=1).tolist()):
         print(f"Sampling p={p}")
-        rate = sample_logical_failure(p)
         results.append(rate)
 
-    plt.figure()
-    plt.loglog(p_list, results, marker='o')
-    plt.xlabel("physical error rate p")
-    plt.ylabel("logical error rate")
-    plt.title("Toy sweep: logical error vs physical error")
-    plt.grid(True)
-    plt.show()
+    if plot:
+        plot_logical_error_vs_p(p_list, results)
     return p_list, results
+
+def plot_logical_error_vs_p(p_list, results, out="logical_error_vs_p.png"):
+    """Log-log plot of sweep_logical_error_vs_p's rates."""
+    fig, ax = _subplots()
+    ax.loglog(p_list, results, marker='o')
+    ax.set_xlabel("physical error rate p")
+    ax.set_ylabel("logical error rate")
+    ax.set_title("Toy sweep: logical error vs physical error")
+    ax.grid(True)
+    fig.savefig(out, dpi=150)
+    print(f"Plot saved as: {out}")
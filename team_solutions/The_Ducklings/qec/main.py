@@ -2,20 +2,18 @@
 Memory Benchmark: Physical vs Logical Error Rates
 """
 
+import os
+import sys
+from functools import lru_cache
+
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend
-import matplotlib.pyplot as plt
-from bloqade.pyqrack import StackMemorySimulator
 from bloqade import squin
-from kirin.dialects.ilist import IList
-
-from .encoding import prepareLogicalQubit, decode_713_block
-from .syndrome import measure_clean_syndromes
-from .error_mapping import color_parities, locate_flipped_qubit
-
 
-emu = StackMemorySimulator()
+from .encoding import prepare_plus_713, prepare_zero_713, prepareLogicalZero
+from .syndrome import extract_syndromes
+from .error_mapping import LOCATE, pack_bits, syndrome_codes, to_bits
+from .sampling import map_tasks, run_shots, warm_tasks
+from .stim_memory import STIM_AVAILABLE, benchmark_compare_stim, benchmark_physical_stim
 
 
 # ============================================================================
@@ -38,45 +36,53 @@ def physical_memory_Z(p: float):
 @squin.kernel
 def logical_with_syndrome(p: float):
     """Encode |0_L⟩, apply noise, measure syndromes."""
-    data = prepareLogicalQubit(0.0, 0.0)
+    data = prepareLogicalZero()
     
     if p > 0:
-        squin.broadcast.depolarize(p, IList([data[0], data[1], data[2], data[3], data[4], data[5], data[6]]))
+        squin.broadcast.depolarize(p, data)
     
     # Measure syndromes
-    probeX = prepareLogicalQubit(0.0, 3.1415926535 / 2)
-    for j in range(7):
-        squin.cx(data[j], probeX[j])
-    measX = squin.broadcast.measure(probeX)
-    
-    probeZ = prepareLogicalQubit(0.0, 0.0)
-    for j in range(7):
-        squin.cx(probeZ[j], data[j])
-    for j in range(7):
-        squin.h(probeZ[j])
-    measZ = squin.broadcast.measure(probeZ)
+    syndromes = extract_syndromes(data)
     
     # Measure data
     data_meas = squin.broadcast.measure(data)
     
-    return data_meas, measX, measZ
+    return data_meas, syndromes[0], syndromes[1]
 
 
-@squin.kernel
-def logical_with_correction(p: float, corr_idx: int):
-    """Apply correction on data qubit then decode."""
-    data = prepareLogicalQubit(0.0, 0.0)
-    
-    if p > 0:
-        squin.broadcast.depolarize(p, IList([data[0], data[1], data[2], data[3], data[4], data[5], data[6]]))
+@lru_cache(maxsize=None)
+def logical_memory_rounds(rounds: int):
+    """
+    R-round version of logical_with_syndrome, built once per round count.
     
-    # Apply correction
-    if 0 <= corr_idx < 7:
-        squin.x(data[corr_idx])
+    Encode |0_L⟩, then `rounds` x (noise + Z-probe syndrome), then the X
+    probe and the data readout, all in one task. One probe register is reset
+    and re-encoded every round and for the X probe (14 qubits in total), and
+    the round count is fixed per kernel, so every qubit address is static.
+    The Z-probe bits of all rounds come back as one flat list of 7 * rounds
+    bits (round-major).
+    """
+    @squin.kernel
+    def kernel(p: float):
+        data = prepareLogicalZero()
+        probe = squin.qalloc(7)
+        measZ = []
+        for r in range(rounds):
+            if p > 0:
+                squin.broadcast.depolarize(p, data)
+            squin.broadcast.reset(probe)
+            prepare_zero_713(probe)
+            squin.broadcast.cx(probe, data)
+            squin.broadcast.h(probe)
+            measZ = measZ + squin.broadcast.measure(probe)
+        # X probe on the same register
+        squin.broadcast.reset(probe)
+        prepare_plus_713(probe)
+        squin.broadcast.cx(data, probe)
+        measX = squin.broadcast.measure(probe)
+        return squin.broadcast.measure(data), measX, measZ
     
-    # Decode and measure
-    decode_713_block(data)
-    return squin.measure(data[6])
+    return kernel
 
 
 # ============================================================================
@@ -85,88 +91,219 @@ def logical_with_correction(p: float, corr_idx: int):
 
 def benchmark_physical(p, shots=500):
     """Physical memory error rate."""
-    results = emu.task(physical_memory_Z, args=(p,)).batch_run(shots=shots)
-    errors = sum(1 for r in results if int(r) == 1)
+    results = to_bits(run_shots(physical_memory_Z, (p,), shots))
+    errors = int(results.sum())
     return errors / shots
 
 
-def benchmark_logical(p, shots=500, postselect=False):
-    """Logical memory error rate with optional post-selection."""
-    # Get baseline syndromes
-    baseX, baseZ = list(emu.task(measure_clean_syndromes, args=(0.0, 0.0)).batch_run(shots=1))[0]
-    synX0 = color_parities([int(b) for b in baseX])
-    synZ0 = color_parities([int(b) for b in baseZ])
+def _sample_rounds(p, shots, rounds):
+    """Data bits (shots, 7), X-probe bits (shots, 7) and Z-probe bits (shots, rounds, 7)."""
+    if rounds == 1:
+        meas = to_bits(run_shots(logical_with_syndrome, (p,), shots))
+        return meas[:, 0], meas[:, 1], meas[:, 2:]
+    results = run_shots(logical_memory_rounds(rounds), (p,), shots)
+    data_meas, measX, measZ = (to_bits([res[i] for res in results]) for i in range(3))
+    return data_meas, measX, measZ.reshape(shots, rounds, 7)
+
+
+@lru_cache(maxsize=None)
+def _rounds_reference(rounds):
+    """
+    Noiseless (codeX, per-round codeZ, data parity) of the `rounds`-round kernel.
     
-    results = emu.task(logical_with_syndrome, args=(p,)).batch_run(shots=shots)
+    The probe signs and the data parity depend on how many probes touched
+    the block (the |0_L⟩ codewords have odd weight, and every Z probe XORs
+    one into the data), but they are deterministic: one noiseless shot per
+    round count serves every p.
+    """
+    data_meas, measX, measZ = _sample_rounds(0.0, 1, rounds)
+    return (int(syndrome_codes(pack_bits(measX[0]))), syndrome_codes(pack_bits(measZ[0])),
+            int(np.bitwise_xor.reduce(data_meas[0])))
+
+
+def benchmark_compare(p, shots=300, out_bits=None, out_parity=None, rounds=1):
+    """
+    Corrected and post-selected logical error rates from one batch of shots.
     
-    failures = 0
-    accepted = 0
+    Both strategies read the same (data, syndrome) sample: correction keeps
+    every shot, post-selection only the ones with trivial syndromes in
+    every round. rounds > 1 samples logical_memory_rounds(rounds).
+    out_bits (>= (shots, 7) uint8) and out_parity (>= (shots,) uint8) are
+    optional scratch buffers, so a sweep can reuse them across p values.
+    """
+    if out_bits is None:
+        out_bits = np.empty((shots, 7), dtype=np.uint8)
+    if out_parity is None:
+        out_parity = np.empty(shots, dtype=np.uint8)
     
-    for data_bits, measX, measZ in results:
-        synX = color_parities([int(b) for b in measX])
-        synZ = color_parities([int(b) for b in measZ])
-        
-        # Post-selection: only accept trivial syndromes
-        if postselect and (synX != synX0 or synZ != synZ0):
-            continue
-        
-        accepted += 1
-        
-        # Locate error
-        x_flip = locate_flipped_qubit(synX0, synX)
-        
-        # Apply correction
-        corr_result = list(emu.task(logical_with_correction, args=(p, x_flip)).batch_run(shots=1))[0]
-        if int(corr_result) == 1:
-            failures += 1
+    # Get baseline syndromes and data parity (cached across the sweep)
+    codeX0, codeZ0, parity0 = _rounds_reference(rounds)
     
-    if accepted == 0:
-        return 1.0
+    data_meas, measX, measZ = _sample_rounds(p, shots, rounds)
+    flipX = syndrome_codes(pack_bits(measX)) ^ codeX0
+    flipZ = np.bitwise_or.reduce(syndrome_codes(pack_bits(measZ)) ^ codeZ0, axis=1)
+    
+    # Post-selection: only accept trivial syndromes (one pass over the
+    # combined 6-bit flip code)
+    accepted_mask = ((flipX << 3) | flipZ) == 0
+    
+    # Locate error
+    x_flip = LOCATE[flipX]
+    
+    # Apply correction classically: X on qubit j only flips measured bit j,
+    # so there is no need to re-run the circuit with the correction applied
+    data_bits = out_bits[:shots]
+    np.copyto(data_bits, data_meas)
+    rows = np.nonzero(x_flip >= 0)[0]
+    data_bits[rows, x_flip[rows]] ^= 1
+    
+    # Logical Z = parity of all 7 data bits, relative to the noiseless parity
+    logical = np.bitwise_xor.reduce(data_bits, axis=1, out=out_parity[:shots])
+    logical ^= parity0
+    
+    corrected_rate = int(logical.sum()) / shots
     
-    return failures / accepted
+    accepted = int(accepted_mask.sum())
+    if accepted == 0:
+        return corrected_rate, 1.0
+    return corrected_rate, int(logical[accepted_mask].sum()) / accepted
+
+
+def benchmark_logical(p, shots=500, postselect=False, out_bits=None, out_parity=None, rounds=1):
+    """Logical memory error rate with optional post-selection (one side of benchmark_compare)."""
+    corrected_rate, postselected_rate = benchmark_compare(p, shots, out_bits, out_parity, rounds)
+    return postselected_rate if postselect else corrected_rate
 
 
 # ============================================================================
 # Main benchmark
 # ============================================================================
 
-def run_benchmark():
-    """Run full benchmark sweep."""
+# Curves plotted against p
+BENCHMARK_MODES = ("physical", "logical", "postselect")
+
+# Shots per p: one physical-qubit point, and one logical point whose sample
+# gives both the "logical" and "postselect" rates
+PHYSICAL_SHOTS = 500
+LOGICAL_SHOTS = 300
+
+
+# Per-process scratch buffers for benchmark_compare, reused across points
+_scratch_bits = np.empty((LOGICAL_SHOTS, 7), dtype=np.uint8)
+_scratch_parity = np.empty(LOGICAL_SHOTS, dtype=np.uint8)
+
+
+def _run_point(task):
+    """Process-pool entry point: {mode: rate} of one (kind, p, backend) point."""
+    kind, p, backend = task
+    if kind == "physical":
+        if backend == "stim":
+            return {"physical": benchmark_physical_stim(p, shots=PHYSICAL_SHOTS)}
+        return {"physical": benchmark_physical(p, shots=PHYSICAL_SHOTS)}
+    if backend == "stim":
+        rates = benchmark_compare_stim(p, shots=LOGICAL_SHOTS)
+    else:
+        rates = benchmark_compare(p, shots=LOGICAL_SHOTS,
+                                  out_bits=_scratch_bits, out_parity=_scratch_parity)
+    return dict(zip(("logical", "postselect"), rates))
+
+
+def _warm_squin_points():
+    """process_pool warm-up of the squin points: both tasks and the noiseless reference."""
+    warm_tasks(physical_memory_Z, logical_with_syndrome)
+    _rounds_reference(1)
+
+
+def run_benchmark(max_workers=None, results_path='memory_fidelity_benchmark.npz', backend=None):
+    """
+    Run full benchmark sweep.
+    
+    Every (mode, p) point is independent, so squin points are spread over a
+    process pool (qec.sampling.map_tasks); each worker builds its tasks and
+    the noiseless reference once. max_workers defaults to the number of CPUs.
+    Stim points take well under a millisecond each, so they run in this
+    process.
+    
+    Only measures: the rates are returned and saved to results_path (skipped
+    if None) so they can be re-plotted with plot_benchmark without re-running
+    the simulator.
+    
+    Every kernel here is Clifford, so by default (backend=None) all points
+    are sampled with Stim (qec.stim_memory) when it is installed;
+    backend="squin" forces the StackMemorySimulator kernels.
+    """
+    if backend is None:
+        backend = "stim" if STIM_AVAILABLE else "squin"
     print("\n" + "="*70)
     print("QUANTUM MEMORY FIDELITY BENCHMARK")
     print("="*70)
     
     p_list = np.logspace(-3, -1, 6)  # [0.001, 0.002, 0.005, 0.010, 0.021, 0.046]
     
-    phys_errs = []
-    log_errs = []
-    post_errs = []
+    tasks = [(kind, p, backend) for p in p_list for kind in ("physical", "logical")]
+    if backend == "stim":
+        max_workers, warm = 1, None
+    else:
+        warm = _warm_squin_points
+    rates = {}
+    for (_, p, _), point in zip(tasks, map_tasks(_run_point, tasks, max_workers=max_workers,
+                                                 warm=warm)):
+        for mode, rate in point.items():
+            rates[mode, p] = rate
+    
+    # One row per mode, one column per p
+    results = {"p_list": p_list}
+    for mode in BENCHMARK_MODES:
+        results[mode] = np.array([rates[mode, p] for p in p_list])
     
-    for p in p_list:
+    for i, p in enumerate(p_list):
         print(f"\nPhysical error rate p = {p:.4f}")
-        
-        phys = benchmark_physical(p, shots=500)
-        log = benchmark_logical(p, shots=300, postselect=False)
-        post = benchmark_logical(p, shots=300, postselect=True)
-        
-        phys_errs.append(phys)
-        log_errs.append(log)
-        post_errs.append(post)
-        
-        print(f"  Physical:       {phys:.4f}")
-        print(f"  Logical:        {log:.4f}")
-        print(f"  Post-selected:  {post:.4f}")
-    
-    # Plot
-    fig, ax = plt.subplots(figsize=(10, 7))
-    
-    ax.loglog(p_list, phys_errs, 'o-', linewidth=2.5, markersize=10, label='Physical (1 qubit)', color='red')
-    ax.loglog(p_list, log_errs, 's-', linewidth=2.5, markersize=10, label='Logical [[7,1,3]] + QEC', color='blue')
-    ax.loglog(p_list, post_errs, '^-', linewidth=2.5, markersize=10, label='Post-Selection', color='green')
+        print(f"  Physical:       {results['physical'][i]:.4f}")
+        print(f"  Logical:        {results['logical'][i]:.4f}")
+        print(f"  Post-selected:  {results['postselect'][i]:.4f}")
+    
+    # Power-law exponent of each curve (~1 physical, ~2 for a distance-3 code),
+    # fitted over the nonzero points only: log(0) would dominate the fit
+    print()
+    for mode in BENCHMARK_MODES:
+        nonzero = results[mode] > 0
+        if nonzero.sum() < 2:
+            print(f"  {mode:<11} error: too few nonzero points to fit")
+            continue
+        slope, _ = np.polyfit(np.log(p_list[nonzero]), np.log(results[mode][nonzero]), 1)
+        print(f"  {mode:<11} error ~ p^{slope:.2f}")
+    
+    if results_path is not None:
+        np.savez(results_path, **results)
+        print(f"\n✓ Saved: {results_path}")
+    print("="*70)
+    return results
+
+
+def plot_benchmark(results='memory_fidelity_benchmark.npz', out='memory_fidelity_benchmark.png',
+                   dpi=150):
+    """Plot the rates returned (or saved) by run_benchmark (dpi=300 for publication figures)."""
+    # A bare Figure renders to file itself, so the caller's pyplot backend is untouched
+    from matplotlib.figure import Figure
+    
+    if isinstance(results, (str, os.PathLike)):
+        results = np.load(results)
+    p_list = np.asarray(results["p_list"])
+    
+    fig = Figure(figsize=(10, 7))
+    ax = fig.subplots()
+    
+    ax.loglog(p_list, results["physical"], 'o-', linewidth=2.5, markersize=10,
+              label='Physical (1 qubit)', color='red')
+    ax.loglog(p_list, results["logical"], 's-', linewidth=2.5, markersize=10,
+              label='Logical [[7,1,3]] + QEC', color='blue')
+    ax.loglog(p_list, results["postselect"], '^-', linewidth=2.5, markersize=10,
+              label='Post-Selection', color='green')
     
     # Reference curves
     ax.loglog(p_list, p_list, '--', alpha=0.4, color='gray', linewidth=1.5, label='~p (linear)')
-    ax.loglog(p_list, [p**2 for p in p_list], ':', alpha=0.4, color='purple', linewidth=1.5, label='~p² (quadratic)')
+    ax.loglog(p_list, p_list**2, ':', alpha=0.4, color='purple', linewidth=1.5,
+              label='~p² (quadratic)')
     
     ax.set_xlabel('Physical Error Rate (p)', fontweight='bold', fontsize=13)
     ax.set_ylabel('Logical Error Rate', fontweight='bold', fontsize=13)
@@ -174,11 +311,10 @@ def run_benchmark():
     ax.legend(fontsize=11, loc='best')
     ax.grid(True, alpha=0.3, which='both')
     
-    plt.tight_layout()
-    plt.savefig('memory_fidelity_benchmark.png', dpi=300, bbox_inches='tight')
-    print("\n✓ Saved: memory_fidelity_benchmark.png")
-    print("="*70)
+    fig.tight_layout()
+    fig.savefig(out, dpi=dpi, bbox_inches='tight')
+    print(f"✓ Saved: {out}")
 
 
 if __name__ == "__main__":
-    run_benchmark()
+    plot_benchmark(run_benchmark(), dpi=300 if "--publication" in sys.argv else 150)
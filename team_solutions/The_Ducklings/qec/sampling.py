@@ -0,0 +1,128 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from functools import lru_cache
+
+import numpy as np
+from bloqade.pyqrack import StackMemorySimulator
+
+# Host-side random stream of the process (shot shuffles, verification draws,
+# toy flips), shared by every module and reseeded in pool workers together
+# with the simulator's
+rng = np.random.default_rng()
+
+# batch_run returns {outcome: probability}, not one result per shot.
+# These helpers expand it back to per-shot outcomes so drivers can
+# submit one task per unique argument tuple instead of one per shot.
+
+@lru_cache(maxsize=None)
+def get_emu() -> StackMemorySimulator:
+    """The process's one simulator, created on first use; every module runs its tasks on it."""
+    return StackMemorySimulator()
+
+@lru_cache(maxsize=None)
+def _compiled_task(kernel):
+    """Task with the kernel's address analysis and memory set up, built once per kernel."""
+    return get_emu().task(kernel)
+
+def bind_task(kernel, args):
+    """
+    get_emu().task(kernel, args=args) without re-running the address analysis.
+
+    The analysis and the qubit count only depend on the kernel, so every
+    argument tuple (noise level, error location, ...) shares one compiled task.
+    """
+    return replace(_compiled_task(kernel), args=tuple(args))
+
+def _reseed() -> None:
+    """
+    Give this process its own random streams.
+
+    A forked worker starts with copies of the parent's generators (and of
+    the simulator's noise generator, if one was created), so without this
+    every worker would draw the same noise. Reseeding in place also reaches
+    the tasks already built on the simulator.
+    """
+    streams = [rng]
+    if get_emu.cache_info().currsize:
+        streams.append(get_emu().rng_state)
+    for stream in streams:
+        stream.bit_generator.state = np.random.default_rng().bit_generator.state
+
+def warm_tasks(*kernels) -> None:
+    """
+    Build the compiled task of each kernel now.
+
+    Called up front (e.g. from a process_pool worker's warm-up) so the first
+    timed shot does not pay for the analysis (kernel lowering itself is
+    already persisted by kirin's on-disk cache in __kirincache__).
+    """
+    for kernel in kernels:
+        _compiled_task(kernel)
+
+def _init_worker(warm) -> None:
+    """process_pool initializer: fresh random streams, then the caller's warm-up."""
+    _reseed()
+    if warm is not None:
+        warm()
+
+def process_pool(max_workers=None, warm=None) -> ProcessPoolExecutor:
+    """
+    Process pool for independent shots or points (max_workers defaults to the CPU count).
+
+    Uses the platform's default start method (spawn on macOS and Windows):
+    forking a process that already holds an OpenCL context or system
+    frameworks is unsafe, so nothing is assumed to be inherited. Each worker
+    reseeds its random streams and then calls `warm` (a module-level
+    function, or a functools.partial of one, so it pickles under spawn) to
+    build its own tasks and references. Under spawn the caller's entry point
+    must be importable and guarded by __main__.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                               initializer=_init_worker, initargs=(warm,))
+
+def map_tasks(fn, *iterables, max_workers=None, warm=None) -> list:
+    """
+    list(map(fn, *iterables)), spread over a process_pool when that pays off.
+
+    The pool gets at most one worker per task (process pools start every
+    worker up front). With a single worker, i.e. one task, max_workers=1 or
+    one CPU, the tasks run in this process and no pool is started.
+    """
+    tasks = list(zip(*iterables))
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        return [fn(*args) for args in tasks]
+    with process_pool(workers, warm) as ex:
+        return list(ex.map(fn, *zip(*tasks)))
+
+def run_once(kernel, args):
+    """Outcome of a single shot of kernel(*args), read without building a list."""
+    return next(iter(bind_task(kernel, args).batch_run(shots=1)))
+
+def run_shots(kernel, args, shots: int) -> list:
+    """Run kernel(*args) for `shots` shots in a single task, one outcome per shot."""
+    if shots <= 0:
+        return []
+    outcomes = bind_task(kernel, args).batch_run(shots=shots)
+    keys = list(outcomes)
+    counts = [round(prob * shots) for prob in outcomes.values()]
+    # batch_run groups identical outcomes; shuffle so shot order carries no information
+    order = rng.permutation(np.repeat(np.arange(len(keys)), counts))
+    return [keys[i] for i in order]
+
+def run_grouped(kernel, shot_args: list) -> list:
+    """
+    Run kernel once per entry of `shot_args`, batching identical argument
+    tuples into a single task. Results come back in the order of `shot_args`.
+    """
+    groups = defaultdict(list)
+    for i, args in enumerate(shot_args):
+        groups[args].append(i)
+
+    results = [None] * len(shot_args)
+    for args, idxs in groups.items():
+        for i, outcome in zip(idxs, run_shots(kernel, args, len(idxs))):
+            results[i] = outcome
+    return results
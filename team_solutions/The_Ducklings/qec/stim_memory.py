@@ -0,0 +1,145 @@
+"""
+Stim sampler for the |0_L⟩ memory benchmark.
+
+Same experiment as main.logical_with_syndrome (encode |0_L⟩, depolarize the
+7 data qubits, read both syndromes and the data), but written as a stabilizer
+circuit so that all shots are drawn in one vectorized Stim call. The encoder
+mirrors the squin kernel; the syndromes are read with noiseless MPP checks
+instead of the probe blocks. The noise
+round can be repeated to model a memory held for several rounds.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from .error_mapping import RED, GREEN, BLUE, LOCATE
+
+# Stim is optional: the squin path in main.py does not need it
+try:
+    import stim
+    STIM_AVAILABLE = True
+except ImportError:
+    STIM_AVAILABLE = False
+
+
+def _x_checks() -> str:
+    """Noiseless MPP measurement of the three X stabilizers, rows ordered (R, G, B)."""
+    return "MPP " + " ".join("*".join(f"X{q}" for q in support) for support in (RED, GREEN, BLUE))
+
+
+# encoding.encode_713_block, gate for gate (sqrt_y -> SQRT_Y, cz -> CZ)
+ENCODE_713 = """
+SQRT_Y_DAG 0 1 2 3 4 5
+CZ 1 2 3 4 5 6
+SQRT_Y 6
+CZ 0 3 2 5
+CZ 4 6
+SQRT_Y 2 3 4 5 6
+CZ 0 1 2 3 4 5
+SQRT_Y 1 2 4
+"""
+
+
+def _encode_block() -> "stim.Circuit":
+    """encode_713_block on |0000000> followed by a noiseless reference round of X checks."""
+    # Detector and observable values are reported relative to Stim's noiseless
+    # reference sample, so the code's stabilizer sign conventions drop out.
+    return stim.Circuit("R 0 1 2 3 4 5 6\n" + ENCODE_713 + _x_checks())
+
+
+def _noise_round(p: float) -> "stim.Circuit":
+    """One memory round: depolarize the data, re-measure the X checks against the previous round."""
+    lines = []
+    if p > 0:
+        lines.append(f"DEPOLARIZE1({p}) 0 1 2 3 4 5 6")
+    lines += [
+        _x_checks(),
+        "DETECTOR rec[-3] rec[-6]",
+        "DETECTOR rec[-2] rec[-5]",
+        "DETECTOR rec[-1] rec[-4]",
+    ]
+    return stim.Circuit("\n".join(lines))
+
+
+def _readout_block() -> "stim.Circuit":
+    """Measure the data: Z-check detectors and the logical Z observable."""
+    lines = ["M 0 1 2 3 4 5 6"]
+    for support in (RED, GREEN, BLUE):
+        lines.append("DETECTOR " + " ".join(f"rec[{q - 7}]" for q in support))
+    lines.append("OBSERVABLE_INCLUDE(0) " + " ".join(f"rec[{q - 7}]" for q in range(7)))
+    return stim.Circuit("\n".join(lines))
+
+
+def memory_circuit(p: float, rounds: int = 1) -> "stim.Circuit":
+    """
+    |0_L⟩ memory circuit: encode, `rounds` noise + X-check rounds, readout.
+
+    Detectors 3r..3r+2: X-stabilizer flips (R, G, B) in round r, i.e. the
+                        Z-probe syndrome of that round.
+    Last 3 detectors:   Z-stabilizer flips (R, G, B) from the data readout,
+                        i.e. the X-probe syndrome.
+    Observable 0:       parity of the 7 data bits.
+
+    The encode and readout blocks are fixed; only the round block depends on
+    p, and it is repeated with a REPEAT block instead of being unrolled.
+    """
+    return _encode_block() + _noise_round(p) * rounds + _readout_block()
+
+
+@lru_cache(maxsize=None)
+def _detector_sampler(p: float, rounds: int):
+    """Compiled sampler per (p, rounds), so sweeps never re-parse or recompile a circuit."""
+    return memory_circuit(p, rounds).compile_detector_sampler()
+
+
+def sample_memory(p: float, shots: int, rounds: int = 1):
+    """
+    Sample `shots` runs of memory_circuit(p, rounds) in one call.
+
+    Returns (codeX, codeZ, logical, clean): 3-bit syndrome flip codes
+    R<<2|G<<1|B (as main.benchmark_logical computes them relative to the
+    reference; codeZ accumulated over all rounds), the uncorrected logical Z
+    bit, and whether no detector fired in any round, all of shape (shots,).
+    """
+    if not STIM_AVAILABLE:
+        raise ImportError("stim is required for the Stim memory sampler")
+
+    det, obs = _detector_sampler(p, rounds).sample(shots, separate_observables=True)
+    det = det.astype(np.uint8)
+
+    weights = np.array([4, 2, 1], dtype=np.uint8)
+    codeZ = np.bitwise_xor.reduce(det[:, :-3].reshape(shots, rounds, 3), axis=1) @ weights
+    codeX = det[:, -3:] @ weights
+    clean = ~det.any(axis=1)
+    return codeX, codeZ, obs[:, 0].astype(np.uint8), clean
+
+
+def benchmark_physical_stim(p, shots=500):
+    """Stim counterpart of main.benchmark_physical: one depolarized qubit read in Z."""
+    if not STIM_AVAILABLE:
+        raise ImportError("stim is required for the Stim memory sampler")
+
+    circuit = stim.Circuit(f"DEPOLARIZE1({p}) 0\nM 0" if p > 0 else "M 0")
+    return float(circuit.compile_sampler().sample(shots)[:, 0].mean())
+
+
+def benchmark_compare_stim(p, shots=500, rounds=1):
+    """Stim counterpart of main.benchmark_compare: (corrected, post-selected) rates, one sample."""
+    codeX, codeZ, logical, clean = sample_memory(p, shots, rounds)
+
+    # An X correction on any located qubit flips the 7-bit parity
+    logical = logical ^ (LOCATE[codeX] >= 0)
+    corrected_rate = int(logical.sum()) / shots
+
+    # Post-selection: only accept shots with trivial syndromes in every round
+    accepted = int(clean.sum())
+    if accepted == 0:
+        return corrected_rate, 1.0
+    return corrected_rate, int(logical[clean].sum()) / accepted
+
+
+def benchmark_logical_stim(p, shots=500, postselect=False, rounds=1):
+    """Stim counterpart of main.benchmark_logical, optionally over several noise rounds."""
+    corrected_rate, postselected_rate = benchmark_compare_stim(p, shots, rounds)
+    return postselected_rate if postselect else corrected_rate
@@ -1,17 +1,69 @@
 from bloqade import squin
-from bloqade.types import MeasurementResult
-from kirin.dialects.ilist import IList
-from typing import Any, Callable
+from functools import lru_cache
+from typing import Callable, Tuple
 
-from .encoding import prepareLogicalQubit
+from .encoding import (prepare_plus_713, prepare_zero_713, prepareLogicalQubit, prepareLogicalPlus,
+                       prepareLogicalZero)
 from .errors import inject_pauli
+from .error_mapping import RED, GREEN, BLUE, SYNDROME_TABLE, pack_bits, syndrome_codes
+from .sampling import run_once
 
-# Cirq noise utilities
-try:
-    from bloqade.cirq_utils import noise, emit_circuit, load_circuit
-    CIRQ_AVAILABLE = True
-except ImportError:
-    CIRQ_AVAILABLE = False
+# Syndrome extraction blocks, shared by every kernel that reads the stabilizers
+# of a data block. Each allocates and measures its own 7-qubit probe. The
+# couplings are transversal, so each is one broadcast layer; the X probe is
+# measured before the Z layer, which keeps the simulated state small.
+
+# X-stabilizer syndrome via |+_L> probe (data -> probe)
+@squin.kernel
+def extract_X_syndrome(data):
+    probe = prepareLogicalPlus()  # |+_L>
+    squin.broadcast.cx(data, probe)
+    return squin.broadcast.measure(probe)
+
+# Z-stabilizer syndrome via |0_L> probe (probe -> data), probe read in X basis
+@squin.kernel
+def extract_Z_syndrome(data):
+    probe = prepareLogicalZero()  # |0_L>
+    squin.broadcast.cx(probe, data)
+    squin.broadcast.h(probe)
+    return squin.broadcast.measure(probe)
+
+# Both syndromes of one round on one 7-qubit probe the caller allocated (in
+# any state): it is read as the |+_L> X probe, then reset and re-prepared as
+# the |0_L> Z probe, so a round simulates 14 qubits instead of 21 and
+# repeated rounds reuse the probe instead of allocating 7 more qubits
+@squin.kernel
+def extract_syndromes_into(data, probe):
+    squin.broadcast.reset(probe)
+    prepare_plus_713(probe)
+    squin.broadcast.cx(data, probe)
+    measX = squin.broadcast.measure(probe)
+
+    squin.broadcast.reset(probe)
+    prepare_zero_713(probe)
+    squin.broadcast.cx(probe, data)
+    squin.broadcast.h(probe)
+    measZ = squin.broadcast.measure(probe)
+
+    return measX, measZ
+
+# Same round on a fresh probe
+@squin.kernel
+def extract_syndromes(data):
+    probe = squin.qalloc(7)
+    return extract_syndromes_into(data, probe)
+
+# In-kernel syndrome code R<<2 | G<<1 | B of one probe measurement
+@squin.kernel
+def probe_syndrome_code(meas) -> int:
+    code = 0
+    for support in [RED, GREEN, BLUE]:
+        bit = 0
+        for q in support:
+            if meas[q] == 1:
+                bit = 1 - bit
+        code = 2 * code + bit
+    return code
 
 # Measure X-stabilizer syndrome via |+_L> probe (data -> probe)
 @squin.kernel
@@ -19,45 +71,36 @@ def measure_X_syndrome(theta: float, phi: float, err_index: int, err_basis: int)
     data = prepareLogicalQubit(theta, phi)
     # option: inject a deterministic error for testing
     inject_pauli(data, err_index, err_basis)
-    probe = prepareLogicalQubit(0.0, 3.1415926535 / 2)  # |+_L>
-    for j in range(7):
-        squin.cx(data[j], probe[j])
-    return squin.broadcast.measure(probe)
+    return extract_X_syndrome(data)
 
 # Measure Z-stabilizer syndrome via |0_L> probe (probe -> data)
 @squin.kernel
 def measure_Z_syndrome(theta: float, phi: float, err_index: int, err_basis: int):
     data = prepareLogicalQubit(theta, phi)
     inject_pauli(data, err_index, err_basis)
-    probe = prepareLogicalQubit(0.0, 0.0)  # |0_L>
-    for j in range(7):
-        squin.cx(probe[j], data[j])
-    # measure probe in X basis
-    for j in range(7):
-        squin.h(probe[j])
-    return squin.broadcast.measure(probe)
+    return extract_Z_syndrome(data)
 
 # Baseline clean syndrome measurement (no injected error)
 @squin.kernel
 def measure_clean_syndromes(theta: float, phi: float):
     data = prepareLogicalQubit(theta, phi)
 
-    probeX = prepareLogicalQubit(0.0, 3.1415926535 / 2)
-    for j in range(7):
-        squin.cx(data[j], probeX[j])
-    measX = squin.broadcast.measure(probeX)
+    return extract_syndromes(data)
 
-    probeZ = prepareLogicalQubit(0.0, 0.0)
-    for j in range(7):
-        squin.cx(probeZ[j], data[j])
-    for j in range(7):
-        squin.h(probeZ[j])
-    measZ = squin.broadcast.measure(probeZ)
-
-    return measX, measZ
+# Reference syndromes of the error-free block. The probe parities are
+# deterministic, so one simulator run per input state serves every benchmark
+# and noise level in the process.
+@lru_cache(maxsize=None)
+def reference_syndromes(theta: float = 0.0, phi: float = 0.0) -> Tuple[int, int]:
+    """Packed (X, Z) syndrome codes of measure_clean_syndromes(theta, phi)."""
+    baseX, baseZ = run_once(measure_clean_syndromes, (theta, phi))
+    return int(syndrome_codes(pack_bits(baseX))), int(syndrome_codes(pack_bits(baseZ)))
 
 # Inject error + measure both syndromes (for error detection)
-# Helper: Apply Cirq GeminiOneZoneNoiseModel to a kernel function
+# Helper: Apply Cirq GeminiOneZoneNoiseModel to a kernel function. The result
+# only depends on (kernel, scaling_factor), so each pair is built once and
+# every shot of a sweep reuses it.
+@lru_cache(maxsize=None)
 def apply_cirq_noise_to_kernel(kernel_func: Callable, scaling_factor: float = 1.0):
     """
     Framework for Cirq noise integration. To apply hardware-realistic noise:
@@ -88,24 +131,17 @@ def measure_error_syndromes(theta: float, phi: float,
     """
     data = prepareLogicalQubit(theta, phi)
 
-    # Inject the specified error
-    inject_pauli(data, err_index, err_basis)
-
-    # Measure X syndrome via |+_L> probe
-    probeX = prepareLogicalQubit(0.0, 3.1415926535 / 2)
-    for j in range(7):
-        squin.cx(data[j], probeX[j])
-    measX = squin.broadcast.measure(probeX)
+    # Inject the specified error (err_index = -1: none)
+    if err_index >= 0:
+        inject_pauli(data, err_index, err_basis)
 
-    # Measure Z syndrome via |0_L> probe
-    probeZ = prepareLogicalQubit(0.0, 0.0)
-    for j in range(7):
-        squin.cx(probeZ[j], data[j])
-    for j in range(7):
-        squin.h(probeZ[j])
-    measZ = squin.broadcast.measure(probeZ)
+    # Measure X and Z syndromes via the |+_L> / |0_L> probe pair
+    return extract_syndromes(data)
 
-    return measX, measZ
+# Net basis of two Paulis on one qubit, PAULI_PRODUCT[3 * a + b] (0 = X,
+# 1 = Y, 2 = Z, -1 = identity up to phase): numbered X=1, Y=2, Z=3 the
+# product is an XOR, folded into a table since the kernels cannot XOR
+PAULI_PRODUCT = tuple(((a + 1) ^ (b + 1)) - 1 for a in range(3) for b in range(3))
 
 # Inject + correct + remeasure verification kernel
 @squin.kernel
@@ -114,34 +150,60 @@ def verify_correction(theta: float, phi: float,
                       corr_index: int, corr_basis: int):
     data = prepareLogicalQubit(theta, phi)
 
-    # inject original error
-    if err_basis == 0:
-        squin.x(data[err_index])
-    elif err_basis == 1:
-        squin.y(data[err_index])
-    elif err_basis == 2:
-        squin.z(data[err_index])
-
-    # apply classical correction (Pauli)
-    if corr_basis == 0:
-        squin.x(data[corr_index])
-    elif corr_basis == 1:
-        squin.y(data[corr_index])
-    elif corr_basis == 2:
-        squin.z(data[corr_index])
-
-    # measure X syndrome
-    probeX = prepareLogicalQubit(0.0, 3.1415926535 / 2)
-    for j in range(7):
-        squin.cx(data[j], probeX[j])
-    measX = squin.broadcast.measure(probeX)
-
-    # measure Z syndrome
-    probeZ = prepareLogicalQubit(0.0, 0.0)
-    for j in range(7):
-        squin.cx(probeZ[j], data[j])
-    for j in range(7):
-        squin.h(probeZ[j])
-    measZ = squin.broadcast.measure(probeZ)
+    # inject the original error and apply the classical correction (Pauli);
+    # on the same qubit they collapse to one Pauli, or none
+    if err_index == corr_index:
+        inject_pauli(data, err_index, PAULI_PRODUCT[3 * err_basis + corr_basis])
+    else:
+        inject_pauli(data, err_index, err_basis)
+        inject_pauli(data, corr_index, corr_basis)
 
-    return measX, measZ
+    # Measure X and Z syndromes via the |+_L> / |0_L> probe pair
+    return extract_syndromes(data)
+
+# Inject + measure + decode + correct + remeasure in one kernel
+@lru_cache(maxsize=None)
+def correct_and_verify(refX: int, refZ: int):
+    """
+    Kernel (theta, phi, err_index, err_basis) -> (measX, measZ, measX2, measZ2)
+    running the whole run_full_QEC cycle as one task.
+
+    The error syndromes are decoded in the kernel (measurement-conditioned X
+    and Z on the located qubits) and the probe is then reused for the
+    verification round. refX / refZ are the error-free codes of the first
+    round (reference_syndromes); they are folded into the two decoder
+    tables at build time, since the kernel cannot XOR them in itself.
+    """
+    locX = tuple(SYNDROME_TABLE[code ^ refX] for code in range(8))
+    locZ = tuple(SYNDROME_TABLE[code ^ refZ] for code in range(8))
+
+    @squin.kernel
+    def kernel(theta: float, phi: float, err_index: int, err_basis: int):
+        data = prepareLogicalQubit(theta, phi)
+        if err_index >= 0:
+            inject_pauli(data, err_index, err_basis)
+
+        probe = squin.qalloc(7)
+        syn = extract_syndromes_into(data, probe)
+
+        qx = locX[probe_syndrome_code(syn[0])]
+        qz = locZ[probe_syndrome_code(syn[1])]
+        if qx >= 0:
+            squin.x(data[qx])
+        if qz >= 0:
+            squin.z(data[qz])
+
+        syn2 = extract_syndromes_into(data, probe)
+        return syn[0], syn[1], syn2[0], syn2[1]
+
+    return kernel
+
+# Error-free codes of the verification round of correct_and_verify. The
+# second round sees a block the first Z probe already touched, so its
+# signs differ from reference_syndromes; like those, they are deterministic.
+@lru_cache(maxsize=None)
+def verify_reference(theta: float = 0.0, phi: float = 0.0) -> Tuple[int, int]:
+    """Packed (X, Z) codes of the second round of an error-free correct_and_verify run."""
+    kernel = correct_and_verify(*reference_syndromes(theta, phi))
+    _, _, measX2, measZ2 = run_once(kernel, (theta, phi, -1, 0))
+    return int(syndrome_codes(pack_bits(measX2))), int(syndrome_codes(pack_bits(measZ2)))
@@ -21,7 +21,6 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
-from collections import Counter
 
 # Ensure qec package is importable
 sys.path.insert(0, os.getcwd())
@@ -125,9 +124,7 @@ for name, p1, shots in configs:
     print(f"Corrected fidelity       = {corr:.4f}")
     
     print("\nAverage injected flips per shot:")
-    total = sum(hist.values())
-    for k in sorted(hist.keys()):
-        frac = hist[k] / total
+    for k, frac in enumerate(hist / hist.sum()):
         print(f"  {k} flips: {frac:.3f}")
 
 print("\n" + "=" * 70)
@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+
+from demo1 import run_modes
+
+
+@pytest.mark.parametrize("p1", [0.05, 0.25, 0.6])
+def test_pauli_frame_model_matches_squin(p1):
+    # Both paths read the same error events for a given seed, so every
+    # fidelity and the flip histogram must agree exactly
+    classical = run_modes(p1, 100, classical=True, seed=7)
+    simulated = run_modes(p1, 100, classical=False, seed=7)
+    for a, b in zip(classical[:4], simulated[:4]):
+        assert a == pytest.approx(b)
+    np.testing.assert_array_equal(classical[4], simulated[4])
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from qec.encoding import prepareLogicalPlus, prepareLogicalQubit, prepareLogicalZero
+from qec.sampling import get_emu
+
+
+def _state(kernel, args=()):
+    return np.asarray(get_emu().state_vector(kernel, args=args))
+
+
+@pytest.mark.parametrize("direct, angles", [
+    (prepareLogicalZero, (0.0, 0.0)),
+    (prepareLogicalPlus, (0.0, np.pi / 2)),
+])
+def test_direct_preparation_matches_encoder(direct, angles):
+    # Same state as the generic encoder, up to a global phase (the simulator
+    # works in single precision)
+    overlap = np.vdot(_state(prepareLogicalQubit, angles), _state(direct))
+    assert abs(overlap) == pytest.approx(1.0, abs=1e-5)